@@ -11,6 +11,11 @@ import os
 
 from django.core.asgi import get_asgi_application
 
+from testapp.clients import serve_asgi
+
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'practiceproject.settings')
 
 application = get_asgi_application()
+
+# Async views can keep their upstream clients on this server's event loop
+serve_asgi()
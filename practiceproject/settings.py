@@ -48,13 +48,32 @@ INSTALLED_APPS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'testapp.authentication.CachedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
-    ]
+    ],
+    # Times JSON rendering for testapp.metrics
+    'DEFAULT_RENDERER_CLASSES': [
+        'testapp.metrics.TimedJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
 }
 
+# Token -> user lookups cached by CachedTokenAuthentication (seconds).
+# Each process keeps them in an LRU for AUTH_TOKEN_LOCAL_CACHE_TTL. Set
+# AUTH_TOKEN_SHARED_CACHE to the alias of a cache shared by every process
+# (Redis, Memcached, database; not locmem) to also keep them there for
+# AUTH_TOKEN_CACHE_TTL, with is_active rechecked every AUTH_TOKEN_ACTIVE_TTL.
+# A change made without saving the model (QuerySet.update()) is seen by
+# every process only once these expire.
+AUTH_TOKEN_SHARED_CACHE = os.getenv('AUTH_TOKEN_SHARED_CACHE') or None
+AUTH_TOKEN_CACHE_TTL = 60
+AUTH_TOKEN_ACTIVE_TTL = 5
+AUTH_TOKEN_LOCAL_CACHE_TTL = 5
+AUTH_TOKEN_LOCAL_CACHE_SIZE = 10000
+
 
 MIDDLEWARE = [
+    'testapp.metrics.performance_middleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -98,6 +117,31 @@ DATABASES = {
     }
 }
 
+# "Production SQLite" profile, enabled with SQLITE_PRODUCTION=true:
+# - WAL journaling so readers don't block the writer (and vice versa), with
+#   synchronous=NORMAL, which is safe in WAL mode and fsyncs far less
+# - a 20 second busy timeout instead of failing with "database is locked"
+# - IMMEDIATE transactions, so a transaction takes the write lock up front
+#   instead of failing when it upgrades from a read
+# - memory-mapped reads and connections kept open between requests
+# The PRAGMAs run on every new connection through the backend's init_command.
+SQLITE_PRODUCTION_PROFILE = {
+    'CONN_MAX_AGE': int(os.getenv('SQLITE_CONN_MAX_AGE', 600)),
+    'CONN_HEALTH_CHECKS': True,
+    'OPTIONS': {
+        'timeout': 20,
+        'transaction_mode': 'IMMEDIATE',
+        'init_command': (
+            'PRAGMA journal_mode=WAL;'
+            'PRAGMA synchronous=NORMAL;'
+            f"PRAGMA mmap_size={int(os.getenv('SQLITE_MMAP_SIZE', 128 * 1024 * 1024))}"
+        ),
+    },
+}
+
+if os.getenv('SQLITE_PRODUCTION', '') == 'true':
+    DATABASES['default'].update(SQLITE_PRODUCTION_PROFILE)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -107,16 +151,36 @@ AUTH_PASSWORD_VALIDATORS = [
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
     },
     {
-        'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator',
-    },
-    {
-        'NAME': 'django.contrib.auth.password_validation.CommonPasswordValidator',
-    },
-    {
-        'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator',
+        # Length, character classes, common and numeric passwords in one pass
+        'NAME': 'testapp.validators.PasswordPolicyValidator',
     },
 ]
 
+# Password hashing (testapp/hashers.py). PASSWORD_HASHER picks the hasher new
+# hashes are made with: 'scrypt' (default), 'argon2' (needs argon2-cffi) or
+# 'pbkdf2'. The others stay listed so existing hashes keep working; they are
+# rehashed with the preferred hasher on the next login.
+PASSWORD_HASHER = os.getenv('PASSWORD_HASHER', 'scrypt')
+_PASSWORD_HASHERS = {
+    'scrypt': 'testapp.hashers.TunedScryptPasswordHasher',
+    'argon2': 'testapp.hashers.TunedArgon2PasswordHasher',
+    'pbkdf2': 'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+}
+PASSWORD_HASHERS = [_PASSWORD_HASHERS[PASSWORD_HASHER]] + [
+    hasher for name, hasher in _PASSWORD_HASHERS.items() if name != PASSWORD_HASHER
+] + [
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+]
+PASSWORD_SCRYPT_WORK_FACTOR = 2 ** 14
+PASSWORD_SCRYPT_BLOCK_SIZE = 8
+PASSWORD_SCRYPT_PARALLELISM = 1
+PASSWORD_ARGON2_TIME_COST = 2
+PASSWORD_ARGON2_MEMORY_COST = 19456  # KiB
+PASSWORD_ARGON2_PARALLELISM = 1
+# Threads hashing passwords for the async register/login views
+PASSWORD_HASHING_WORKERS = int(os.getenv('PASSWORD_HASHING_WORKERS', 4))
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.1/topics/i18n/
@@ -156,4 +220,98 @@ SWAGGER_SETTINGS = {
     'USE_SESSION_AUTH': False,  # Prevents login button from appearing in Swagger UI
 }
 
-OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
\ No newline at end of file
+OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
+OPENAI_BASE_URL = os.getenv('OPENAI_BASE_URL')  # None means the official API
+
+# OpenAI client pool (testapp/clients.py), shared by each worker process.
+# Timeouts are in seconds; OPENAI_MAX_CONCURRENCY bounds in-flight upstream
+# calls per process and OPENAI_QUEUE_TIMEOUT is how long a request waits for one.
+OPENAI_CONNECT_TIMEOUT = float(os.getenv('OPENAI_CONNECT_TIMEOUT', 5))
+OPENAI_READ_TIMEOUT = float(os.getenv('OPENAI_READ_TIMEOUT', 60))
+OPENAI_MAX_RETRIES = int(os.getenv('OPENAI_MAX_RETRIES', 2))
+OPENAI_MAX_CONNECTIONS = int(os.getenv('OPENAI_MAX_CONNECTIONS', 20))
+OPENAI_MAX_CONCURRENCY = int(os.getenv('OPENAI_MAX_CONCURRENCY', 8))
+OPENAI_QUEUE_TIMEOUT = float(os.getenv('OPENAI_QUEUE_TIMEOUT', 30))
+
+# Chatbot prompt context: the most recent messages sent to OpenAI are limited
+# both by count and by an approximate token budget. Older turns are folded
+# into a rolling summary of at most CHATBOT_SUMMARY_MAX_TOKENS, which is
+# reserved out of the total budget. Messages are folded
+# CHATBOT_SUMMARY_BATCH_SIZE at a time, oldest first, so only about one turn
+# in CHATBOT_SUMMARY_BATCH_SIZE / 2 pays for an extra upstream call. Keep it
+# below CHATBOT_CONTEXT_MAX_MESSAGES, or no recent turn is left verbatim.
+CHATBOT_CONTEXT_MAX_MESSAGES = 10
+CHATBOT_CONTEXT_MAX_TOKENS = 3000
+CHATBOT_SUMMARY_MAX_TOKENS = 300
+CHATBOT_SUMMARY_BATCH_SIZE = 6
+
+# Opt-in cache of completions for identical prompts (testapp/completion_cache.py)
+CHATBOT_COMPLETION_CACHE_ENABLED = os.getenv('CHATBOT_COMPLETION_CACHE_ENABLED', '') == 'true'
+
+# Background chat completions (testapp/jobs.py). Each web process runs
+# CHATBOT_JOB_WORKERS worker threads; set it to 0 and run
+# `manage.py run_chat_worker` instead to cap upstream concurrency globally.
+CHATBOT_JOB_WORKERS = int(os.getenv('CHATBOT_JOB_WORKERS', 2))
+CHATBOT_JOB_POLL_INTERVAL = 1  # seconds
+# A worker refreshes its claim on a running job every
+# CHATBOT_JOB_HEARTBEAT_INTERVAL seconds; a job whose claim has not been
+# refreshed for CHATBOT_JOB_STALE_AFTER seconds (its worker died) is retried.
+CHATBOT_JOB_HEARTBEAT_INTERVAL = 30
+CHATBOT_JOB_STALE_AFTER = 120
+
+# Batch chat endpoint: at most CHATBOT_BATCH_MAX_ITEMS messages per request,
+# answered with up to CHATBOT_BATCH_CONCURRENCY upstream calls at once
+CHATBOT_BATCH_MAX_ITEMS = int(os.getenv('CHATBOT_BATCH_MAX_ITEMS', 10))
+CHATBOT_BATCH_CONCURRENCY = int(os.getenv('CHATBOT_BATCH_CONCURRENCY', 4))
+
+# Conversations whose newest message is older than this are moved to
+# compressed archives by `manage.py archive_conversations` (testapp/archive.py)
+CHATBOT_ARCHIVE_AFTER_DAYS = int(os.getenv('CHATBOT_ARCHIVE_AFTER_DAYS', 90))
+
+# Who may read /api/metrics/ besides staff users: scrapers sending
+# "Authorization: Bearer $METRICS_TOKEN", and the comma-separated
+# METRICS_ALLOWED_IPS. Both are off by default. Don't list addresses when
+# running behind a reverse proxy, where every request comes from the proxy.
+METRICS_TOKEN = os.getenv('METRICS_TOKEN') or None
+METRICS_ALLOWED_IPS = [ip for ip in os.getenv('METRICS_ALLOWED_IPS', '').split(',') if ip]
+
+# Chat rate limiting and admission control (testapp/throttling.py).
+# Each user may send CHAT_THROTTLE_BURST messages at once, refilled at
+# CHAT_THROTTLE_RATE per second. At most CHAT_MAX_INFLIGHT upstream calls run
+# at a time across all processes sharing the 'throttle' cache; beyond that
+# requests get a 429 with Retry-After CHAT_INFLIGHT_RETRY_AFTER.
+CHAT_THROTTLE_RATE = float(os.getenv('CHAT_THROTTLE_RATE', 0.5))
+CHAT_THROTTLE_BURST = int(os.getenv('CHAT_THROTTLE_BURST', 10))
+CHAT_MAX_INFLIGHT = int(os.getenv('CHAT_MAX_INFLIGHT', 32))
+CHAT_INFLIGHT_RETRY_AFTER = 2  # seconds
+# Longer than the slowest upstream call, retries included
+CHAT_INFLIGHT_SLOT_TTL = 300  # seconds
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Least recently used entries are evicted past MAX_ENTRIES
+    'completions': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'completions',
+        'TIMEOUT': int(os.getenv('CHATBOT_COMPLETION_CACHE_TTL', 3600)),
+        'OPTIONS': {
+            'MAX_ENTRIES': 1000,
+        },
+    },
+    # Rate limit buckets and in-flight slots. CHAT_THROTTLE_CACHE=database
+    # shares them between processes (run `manage.py createcachetable` first).
+    'throttle': {
+        'BACKEND': (
+            'django.core.cache.backends.db.DatabaseCache'
+            if os.getenv('CHAT_THROTTLE_CACHE') == 'database'
+            else 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': 'chat_throttle',
+        'OPTIONS': {
+            # Culling must not drop in-flight slots
+            'MAX_ENTRIES': 100000,
+        },
+    },
+}
@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class TestappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'testapp'
+
+    def ready(self):
+        from django.contrib.auth.password_validation import get_default_password_validators
+
+        from . import signals  # noqa: F401  (connects the receivers)
+
+        # Build the validators now, so the common-password list is loaded at
+        # startup rather than during the first registration
+        get_default_password_validators()
@@ -0,0 +1,152 @@
+import gzip
+import json
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Conversation, ConversationArchive, Message
+
+# Cold storage for idle conversations.
+# archive_conversation() moves a conversation's messages out of the Message
+# table into one gzip-compressed JSON blob (ConversationArchive), keeping the
+# hot table and its indexes small. Reads are served from the blob as is;
+# the messages go back into the Message table (restore_conversation) only
+# when the conversation is continued. Archived messages are not in the
+# full-text search index.
+
+ARCHIVED_FIELDS = [
+    'id', 'content', 'is_user', 'created_at',
+    'model', 'prompt_tokens', 'completion_tokens', 'latency_ms', 'finish_reason',
+]
+COMPRESSION_LEVEL = 6
+
+
+def _encode(messages):
+    rows = [[getattr(message, field) for field in ARCHIVED_FIELDS] for message in messages]
+    created_at = ARCHIVED_FIELDS.index('created_at')
+    for row in rows:
+        row[created_at] = row[created_at].isoformat()
+    raw = json.dumps({"fields": ARCHIVED_FIELDS, "rows": rows}, separators=(',', ':')).encode()
+    return raw, gzip.compress(raw, COMPRESSION_LEVEL)
+
+
+def _decode(data, conversation):
+    payload = json.loads(gzip.decompress(data))
+    messages = []
+    for row in payload["rows"]:
+        fields = dict(zip(payload["fields"], row))
+        fields['created_at'] = parse_datetime(fields['created_at'])
+        messages.append(Message(conversation=conversation, **fields))
+    return messages
+
+
+def get_archive(conversation):
+    """The conversation's ConversationArchive, or None (no query if select_related)"""
+    try:
+        return conversation.archive
+    except ConversationArchive.DoesNotExist:
+        return None
+
+
+def archived_messages(conversation):
+    """The archived messages of a conversation, oldest first, or None if it isn't archived"""
+    archive = get_archive(conversation)
+    if archive is None:
+        return None
+    return _decode(archive.data, conversation)
+
+
+def idle_cutoff(days):
+    return timezone.now() - timedelta(days=days)
+
+
+def idle_conversations(days):
+    """Conversations with messages in the Message table, the newest older than ``days`` days"""
+    return (
+        Conversation.objects.filter(
+            archive__isnull=True, message_count__gt=0, last_message_at__lt=idle_cutoff(days)
+        )
+        .order_by('last_message_at')
+    )
+
+
+def archive_conversation(conversation, idle_before=None):
+    """
+    Move the conversation's messages into a ConversationArchive.
+
+    With ``idle_before``, only if its last message is still older than that:
+    this is checked with the conversation row locked, which a turn being
+    saved holds too, so the conversation is not archived under it (and a
+    turn saved right after restores the archive, see restore_archived()).
+
+    Returns (messages archived, JSON size, compressed size).
+    """
+    with transaction.atomic():
+        if idle_before is not None:
+            idle = Conversation.objects.select_for_update().filter(
+                id=conversation.id, last_message_at__lt=idle_before
+            )
+            if not idle.exists():
+                return 0, 0, 0
+        messages = list(conversation.messages.order_by('created_at', 'id'))
+        if not messages:
+            return 0, 0, 0
+        raw, data = _encode(messages)
+        ConversationArchive.objects.create(
+            conversation=conversation,
+            data=data,
+            message_count=len(messages),
+            last_message_preview=messages[-1].content[:100],
+            last_message_at=messages[-1].created_at,
+        )
+        # Not messages saved since they were read
+        conversation.messages.filter(id__lte=max(message.id for message in messages)).delete()
+    return len(messages), len(raw), len(data)
+
+
+def restore_conversation(conversation):
+    """
+    Move archived messages back into the Message table, with their ids and
+    timestamps. Returns whether the conversation was archived.
+    """
+    with transaction.atomic():
+        archive = ConversationArchive.objects.filter(conversation=conversation).first()
+        if archive is None:
+            return False
+        # Only one of two concurrent restores deletes the archive
+        deleted, _ = ConversationArchive.objects.filter(pk=archive.pk).delete()
+        if not deleted:
+            return False
+
+        messages = _decode(archive.data, conversation)
+        created_at = [message.created_at for message in messages]
+        Message.objects.bulk_create(messages)
+        # auto_now_add overwrote created_at on insert; put the original times back
+        for message, timestamp in zip(messages, created_at):
+            message.created_at = timestamp
+        Message.objects.bulk_update(messages, ['created_at'], batch_size=500)
+
+    conversation._state.fields_cache.pop('archive', None)  # Forget the cached archive
+    return True
+
+
+def restore_archived(conversations):
+    """
+    Restore those of the conversations that were archived after they were
+    read, with a single query when none was.
+
+    Turns are saved without holding a transaction during the upstream call,
+    so a conversation can be archived meanwhile; the new messages would be
+    hidden behind the archive. Call this after updating the conversation
+    rows, in the same transaction.
+    """
+    archived = set(
+        ConversationArchive.objects.filter(conversation__in=conversations)
+        .values_list('conversation_id', flat=True)
+    )
+    for conversation in conversations:
+        if conversation.id in archived:
+            archived.discard(conversation.id)
+            restore_conversation(conversation)
@@ -0,0 +1,333 @@
+import json
+import math
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.db.models import aprefetch_related_objects
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+
+from rest_framework import exceptions
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.utils.encoders import JSONEncoder
+
+from . import conditional, metrics
+from .archive import archived_messages, get_archive
+from .authentication import CachedTokenAuthentication
+from .hashers import acheck_user_password, ahash_password
+from .models import Conversation
+from .pagination import (
+    decode_cursor, get_page_size, keyset_page, keyset_result, message_page, message_page_in_memory, message_result,
+    parse_message_cursors
+)
+from .serializers import (
+    ChatMessageSerializer, ConversationSerializer, ConversationSummarySerializer, LoginCredentialsSerializer,
+    MessageSerializer, RegisterSerializer, UserSerializer
+)
+from .services import ChatbotService
+from .throttling import acquire_inflight_slot, release_inflight_slot, take_token
+
+# Async views, served through practiceproject/asgi.py.
+# DRF function views are synchronous, so these are plain Django views that
+# reproduce the token/session authentication of the API views. They are
+# csrf_exempt for token clients; session-authenticated requests go through
+# the CSRF check here instead, as with DRF's SessionAuthentication.
+
+async def authenticate_request(request):
+    """
+    Authenticate with the request's token or session.
+
+    Returns (user, None), or (None, a 401/403 response).
+    """
+    try:
+        result = await sync_to_async(CachedTokenAuthentication().authenticate)(request)
+    except exceptions.AuthenticationFailed:
+        return None, unauthorized()
+    if result is not None:
+        return result[0], None
+
+    user = await request.auser()
+    if not user.is_authenticated:
+        return None, unauthorized()
+    try:
+        SessionAuthentication().enforce_csrf(request)
+    except exceptions.PermissionDenied as e:
+        return None, api_response({"detail": e.detail}, status=403)
+    return user, None
+
+
+def api_response(data, status=200):
+    """JSON response encoded like DRF's Response (datetimes, decimals, ...)"""
+    with metrics.serialization():
+        return JsonResponse(data, status=status, encoder=JSONEncoder, safe=False)
+
+
+def unauthorized():
+    return api_response({"detail": "Authentication credentials were not provided."}, status=401)
+
+
+def too_many_requests(wait, detail="Request was throttled."):
+    response = api_response({"detail": detail}, status=429)
+    response['Retry-After'] = str(math.ceil(wait))
+    return response
+
+
+async def _admit(user):
+    """
+    Apply the chat rate limit and claim an upstream slot.
+
+    Returns (slot, None), or (None, a 429 response).
+    """
+    wait = await sync_to_async(take_token)(user)
+    if wait is not None:
+        return None, too_many_requests(wait)
+    try:
+        return await sync_to_async(acquire_inflight_slot)(), None
+    except exceptions.Throttled as e:
+        return None, too_many_requests(e.wait, e.detail)
+
+
+def _read_json(request):
+    """
+    Parse a JSON request body.
+
+    Returns (data, None), or (None, a 400/415 response). Other content types
+    are refused, so that a cross-site form can't post to these views.
+    """
+    if request.content_type != 'application/json':
+        return None, api_response(
+            {"detail": f'Unsupported media type "{request.content_type}" in request.'}, status=415
+        )
+    try:
+        return json.loads(request.body or b"{}"), None
+    except ValueError:
+        return None, api_response({"detail": "Invalid JSON."}, status=400)
+
+
+def format_sse(event, data):
+    """Encode a single Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _sse_stream(events, slot):
+    try:
+        async for event, data in events:
+            yield format_sse(event, data)
+    finally:
+        # If the client left, close the events now so the turn is saved
+        # (see stream_chat_response) while the request is still running
+        await events.aclose()
+        # Hold the upstream slot until the stream is done or the client leaves
+        await sync_to_async(release_inflight_slot)(slot)
+
+
+@csrf_exempt
+@require_POST
+async def chat_message_stream(request):
+    """Send a message to the chatbot and stream the response as Server-Sent Events"""
+    user, rejected = await authenticate_request(request)
+    if rejected:
+        return rejected
+
+    data, rejected = _read_json(request)
+    if rejected:
+        return rejected
+
+    serializer = ChatMessageSerializer(data=data)
+    if not serializer.is_valid():
+        return api_response(serializer.errors, status=400)
+
+    slot, rejected = await _admit(user)
+    if rejected:
+        return rejected
+
+    chatbot = ChatbotService()
+    events = chatbot.stream_chat_response(
+        user=user,
+        message_text=serializer.validated_data['message'],
+        conversation_id=serializer.validated_data.get('conversation_id')
+    )
+    response = StreamingHttpResponse(_sse_stream(events, slot), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Don't let a proxy buffer the stream
+    return response
+
+
+@csrf_exempt
+@require_POST
+async def chat_message(request):
+    """Send a message to the chatbot and get a response"""
+    user, rejected = await authenticate_request(request)
+    if rejected:
+        return rejected
+
+    data, rejected = _read_json(request)
+    if rejected:
+        return rejected
+
+    serializer = ChatMessageSerializer(data=data)
+    if not serializer.is_valid():
+        return api_response(serializer.errors, status=400)
+
+    slot, rejected = await _admit(user)
+    if rejected:
+        return rejected
+
+    chatbot = ChatbotService()
+    try:
+        response = await chatbot.aget_chat_response(
+            user=user,
+            message_text=serializer.validated_data['message'],
+            conversation_id=serializer.validated_data.get('conversation_id')
+        )
+    finally:
+        await sync_to_async(release_inflight_slot)(slot)
+    return api_response(response)
+
+
+@require_GET
+async def get_conversations(request):
+    """Get all conversations for the current user"""
+    user, rejected = await authenticate_request(request)
+    if rejected:
+        return rejected
+
+    # Most recently active first
+    conversations = Conversation.objects.filter(user=user).order_by('-last_message_at', '-id')
+    version = await conditional.alist_version(conversations)
+    unchanged = conditional.not_modified(request, version)
+    if unchanged:
+        return unchanged
+
+    if request.GET.get('summary') in ('1', 'true'):
+        cursor = request.GET.get('cursor')
+        position = decode_cursor(cursor) if cursor else None
+        if cursor and position is None:
+            return api_response({"error": "Invalid cursor"}, status=400)
+
+        page_size = get_page_size(request.GET)
+        rows = [c async for c in keyset_page(conversations.with_summary(), 'last_message_at', position, page_size)]
+        page, next_cursor = keyset_result(rows, 'last_message_at', page_size)
+        serializer = ConversationSummarySerializer(page, many=True)
+        return conditional.add_validators(
+            api_response({"results": serializer.data, "next_cursor": next_cursor}), version
+        )
+
+    conversations = [c async for c in conversations.select_related('archive').prefetch_related('messages')]
+    serializer = ConversationSerializer(conversations, many=True)
+    return conditional.add_validators(api_response(serializer.data), version)
+
+
+@require_GET
+async def get_conversation(request, conversation_id):
+    """Get a specific conversation by ID"""
+    user, rejected = await authenticate_request(request)
+    if rejected:
+        return rejected
+
+    try:
+        conversation = await (
+            Conversation.objects.select_related('archive')
+            .defer('archive__data')  # Not needed for a 304
+            .aget(id=conversation_id, user=user)
+        )
+    except Conversation.DoesNotExist:
+        return api_response({"error": "Conversation not found"}, status=404)
+
+    version = conditional.conversation_version(conversation)
+    unchanged = conditional.not_modified(request, version)
+    if unchanged:
+        return unchanged
+
+    archive = get_archive(conversation)
+    if archive is not None:
+        # Loaded here, as reading a deferred field would query synchronously
+        await archive.arefresh_from_db(fields=['data'])
+
+    if not any(param in request.GET for param in ('limit', 'before', 'after')):
+        # The serializer reads every message
+        await aprefetch_related_objects([conversation], 'messages')
+        serializer = ConversationSerializer(conversation)
+        return conditional.add_validators(api_response(serializer.data), version)
+
+    try:
+        before, after = parse_message_cursors(request.GET)
+    except ValueError:
+        return api_response({"error": "before and after must be message ids"}, status=400)
+
+    page_size = get_page_size(request.GET, default=50)
+    archived = archived_messages(conversation)
+    if archived is not None:
+        rows, newest_first = message_page_in_memory(archived, before, after, page_size)
+    else:
+        messages, newest_first = message_page(conversation.messages.all(), before, after, page_size)
+        rows = [m async for m in messages]
+    page, has_more = message_result(rows, page_size, newest_first)
+
+    return conditional.add_validators(api_response({
+        "id": conversation.id,
+        "created_at": conversation.created_at,
+        "messages": MessageSerializer(page, many=True).data,
+        "has_more": has_more,
+    }), version)
+
+
+@csrf_exempt
+@require_POST
+async def create_conversation(request):
+    """Create a new empty conversation"""
+    user, rejected = await authenticate_request(request)
+    if rejected:
+        return rejected
+
+    conversation = await Conversation.objects.acreate(user=user)
+    return api_response({"conversation_id": conversation.id}, status=201)
+
+
+@csrf_exempt
+@require_POST
+async def register(request):
+    """Register a new user and return a token, hashing the password on the hashing pool"""
+    data, rejected = _read_json(request)
+    if rejected:
+        return rejected
+
+    serializer = RegisterSerializer(data=data)
+    if not serializer.is_valid():
+        return api_response(serializer.errors, status=400)
+
+    password_hash = await ahash_password(serializer.validated_data['password'])
+    try:
+        user = await sync_to_async(serializer.save)(password_hash=password_hash)
+    except exceptions.ValidationError as e:
+        return api_response(e.detail, status=400)
+
+    token = await Token.objects.acreate(user=user)
+    return api_response({'user': UserSerializer(user).data, 'token': token.key}, status=201)
+
+
+@csrf_exempt
+@require_POST
+async def login(request):
+    """Login with username and password to get a token, checking the password on the hashing pool"""
+    data, rejected = _read_json(request)
+    if rejected:
+        return rejected
+
+    serializer = LoginCredentialsSerializer(data=data)
+    if not serializer.is_valid():
+        return api_response(serializer.errors, status=400)
+
+    password = serializer.validated_data['password']
+    user = await User.objects.filter(username=serializer.validated_data['username']).afirst()
+    if user is None:
+        # Hash anyway so that unknown usernames take as long as wrong
+        # passwords, as ModelBackend does
+        await ahash_password(password)
+    elif await acheck_user_password(user, password) and user.is_active:
+        token, created = await Token.objects.aget_or_create(user=user)
+        return api_response({'user': UserSerializer(user).data, 'token': token.key})
+
+    return api_response({"non_field_errors": ["Invalid credentials. Please try again."]}, status=400)
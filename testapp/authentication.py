@@ -0,0 +1,166 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
+
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+
+class LocalLRUCache:
+    """Small thread-safe in-process LRU cache whose entries expire after ``ttl`` seconds"""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+def _shared_cache():
+    """The cache named by AUTH_TOKEN_SHARED_CACHE, or None"""
+    alias = settings.AUTH_TOKEN_SHARED_CACHE
+    if not alias:
+        return None
+    shared = caches[alias]
+    if isinstance(shared, (LocMemCache, DummyCache)):
+        # Its entries couldn't be invalidated from other processes
+        raise ImproperlyConfigured(
+            f"AUTH_TOKEN_SHARED_CACHE must name a cache shared by all processes, "
+            f"not a {type(shared).__name__}"
+        )
+    return shared
+
+
+_local_users = LocalLRUCache(
+    maxsize=settings.AUTH_TOKEN_LOCAL_CACHE_SIZE,
+    ttl=settings.AUTH_TOKEN_LOCAL_CACHE_TTL,
+)
+
+
+# The user fields cached for a token. The password hash stays out of the
+# caches; it is loaded (as a deferred field) if a request reads it.
+_USER_FIELDS = [field.attname for field in User._meta.concrete_fields if field.name != 'password']
+_PK = _USER_FIELDS.index(User._meta.pk.attname)
+_IS_ACTIVE = _USER_FIELDS.index('is_active')
+
+
+def _user_data(user):
+    return [getattr(user, name) for name in _USER_FIELDS]
+
+
+def _user_from_data(values):
+    """A new User instance for each request, so changes made to it aren't shared"""
+    return User.from_db(DEFAULT_DB_ALIAS, _USER_FIELDS, values)
+
+
+def _cache_key(token_key):
+    # Don't put raw tokens in cache keys
+    return 'auth-token:' + hashlib.sha256(token_key.encode()).hexdigest()
+
+
+def _active_key(cache_key):
+    return cache_key + ':active'
+
+
+def _shared_get(shared, cache_key):
+    """The user data of a token from the shared cache, with a recent is_active, or None"""
+    entries = shared.get_many([cache_key, _active_key(cache_key)])
+    data = entries.get(cache_key)
+    if data is None:
+        return None
+    is_active = entries.get(_active_key(cache_key))
+    if is_active is None:
+        is_active = User.objects.filter(pk=data[_PK]).values_list('is_active', flat=True).first()
+        if is_active is None:
+            return None  # Deleted
+        shared.set(_active_key(cache_key), is_active, settings.AUTH_TOKEN_ACTIVE_TTL)
+    data = list(data)
+    data[_IS_ACTIVE] = is_active
+    return data
+
+
+def _shared_set(shared, cache_key, data):
+    shared.set(cache_key, data, settings.AUTH_TOKEN_CACHE_TTL)
+    shared.set(_active_key(cache_key), data[_IS_ACTIVE], settings.AUTH_TOKEN_ACTIVE_TTL)
+
+
+def invalidate_token(token_key):
+    """Forget the cached user of a token (see signals.py)"""
+    cache_key = _cache_key(token_key)
+    _local_users.delete(cache_key)
+    shared = _shared_cache()
+    if shared is not None:
+        shared.delete_many([cache_key, _active_key(cache_key)])
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication that remembers which user a token belongs to.
+
+    Lookups go to an in-process LRU first, then to the cache named by
+    AUTH_TOKEN_SHARED_CACHE if there is one, and only then to the
+    authtoken/auth_user tables. Entries are dropped when the token is
+    deleted or the user is saved (deactivated, profile updated, ...), in
+    this process and in the shared cache; the LRU entries of other processes
+    can't be reached and live out their AUTH_TOKEN_LOCAL_CACHE_TTL.
+
+    Changes that send no signal (QuerySet.update(), raw SQL) are only seen
+    once entries expire. The shared cache keeps is_active for just
+    AUTH_TOKEN_ACTIVE_TTL seconds, so such a deactivation takes effect within
+    AUTH_TOKEN_LOCAL_CACHE_TTL + AUTH_TOKEN_ACTIVE_TTL seconds; other fields
+    can be up to AUTH_TOKEN_CACHE_TTL old.
+    """
+
+    def authenticate_credentials(self, key):
+        cache_key = _cache_key(key)
+        data = _local_users.get(cache_key)
+        if data is None:
+            shared = _shared_cache()
+            if shared is not None:
+                data = _shared_get(shared, cache_key)
+            if data is None:
+                user, token = super().authenticate_credentials(key)
+                data = _user_data(user)
+                if shared is not None:
+                    _shared_set(shared, cache_key, data)
+            _local_users.set(cache_key, data)
+
+        user = _user_from_data(data)
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+
+        return (user, Token(key=key, user=user))
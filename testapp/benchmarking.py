@@ -0,0 +1,103 @@
+import json
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+from contextlib import contextmanager
+
+from django.db import connection
+from django.test.utils import override_settings
+
+from .clients import reset_clients
+from .openai_stub import StubOpenAIServer
+
+# Helpers shared by the bench_* management commands.
+
+
+@contextmanager
+def benchmark_database():
+    """
+    Run against a throwaway copy of the schema instead of db.sqlite3.
+
+    The database is a file (not SQLite's in-memory test database) so that
+    concurrent connections behave as they would in production.
+    """
+    old_name = connection.settings_dict['NAME']
+    with tempfile.TemporaryDirectory() as directory:
+        connection.settings_dict['TEST']['NAME'] = os.path.join(directory, 'benchmark.sqlite3')
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            yield
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+@contextmanager
+def stub_upstream(latency, **overrides):
+    """Point the OpenAI clients at a local stub server for the duration"""
+    with StubOpenAIServer(latency=latency) as stub:
+        with override_settings(
+            OPENAI_API_KEY='stub',
+            OPENAI_BASE_URL=stub.base_url,
+            ALLOWED_HOSTS=['testserver'],
+            **overrides
+        ):
+            reset_clients()
+            try:
+                yield stub
+            finally:
+                reset_clients()
+
+
+def percentile(sorted_samples, fraction):
+    """Nearest-rank percentile of already sorted samples"""
+    if not sorted_samples:
+        return None
+    index = min(len(sorted_samples) - 1, max(0, round(fraction * len(sorted_samples)) - 1))
+    return sorted_samples[index]
+
+
+def latency_summary(samples, elapsed):
+    """Summarize per-request latencies (seconds) over a run that took ``elapsed`` seconds"""
+    samples = sorted(samples)
+    return {
+        "requests": len(samples),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(samples) / elapsed, 2) if elapsed else None,
+        "mean_ms": round(statistics.mean(samples) * 1000, 2) if samples else None,
+        "p50_ms": round(percentile(samples, 0.50) * 1000, 2) if samples else None,
+        "p95_ms": round(percentile(samples, 0.95) * 1000, 2) if samples else None,
+        "p99_ms": round(percentile(samples, 0.99) * 1000, 2) if samples else None,
+    }
+
+
+def timed(func, *args, **kwargs):
+    """Call func and return (result, seconds taken)"""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_results(path, name, results, parameters):
+    """Write machine-readable results, tagged with the commit, for comparing runs"""
+    document = {
+        "benchmark": name,
+        "revision": _git_revision(),
+        "python": platform.python_version(),
+        "parameters": parameters,
+        "results": results,
+    }
+    with open(path, 'w') as f:
+        json.dump(document, f, indent=2)
@@ -0,0 +1,161 @@
+import asyncio
+import threading
+import weakref
+from contextlib import asynccontextmanager, contextmanager
+
+import httpx
+import openai
+from django.conf import settings
+
+# Process-wide OpenAI clients.
+# Each client owns an httpx connection pool with keep-alive, so TLS
+# handshakes happen once per connection instead of once per request.
+# Retries on 408/409/429/5xx and connection errors, with exponential backoff
+# and jitter, are done by the OpenAI SDK (OPENAI_MAX_RETRIES).
+
+_lock = threading.Lock()
+_client = None
+_async_clients = weakref.WeakKeyDictionary()
+_slots = None
+_async_slots = weakref.WeakKeyDictionary()
+_serving_asgi = False
+
+
+class UpstreamBusy(Exception):
+    """Raised when no upstream slot frees up within OPENAI_QUEUE_TIMEOUT"""
+
+
+def _timeout():
+    return httpx.Timeout(
+        settings.OPENAI_READ_TIMEOUT,
+        connect=settings.OPENAI_CONNECT_TIMEOUT,
+    )
+
+
+def _limits():
+    return httpx.Limits(
+        max_connections=settings.OPENAI_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.OPENAI_MAX_CONNECTIONS,
+    )
+
+
+def get_openai_client():
+    """Return the shared synchronous OpenAI client, creating it on first use"""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = openai.OpenAI(
+                    api_key=settings.OPENAI_API_KEY,
+                    base_url=settings.OPENAI_BASE_URL,
+                    timeout=_timeout(),
+                    max_retries=settings.OPENAI_MAX_RETRIES,
+                    http_client=httpx.Client(timeout=_timeout(), limits=_limits()),
+                )
+    return _client
+
+
+def serve_asgi(enabled=True):
+    """
+    Record whether this process serves requests from a long-lived event loop.
+
+    practiceproject/asgi.py calls this; anything else (runserver, gunicorn's
+    sync workers, management commands) is taken to be WSGI.
+    """
+    global _serving_asgi
+    _serving_asgi = enabled
+
+
+def serving_asgi():
+    """Whether this process serves requests with ASGI (see serve_asgi())"""
+    return _serving_asgi
+
+
+def has_long_lived_loop():
+    """
+    Whether the running event loop serves more than the current request.
+
+    Under WSGI Django runs each async view, and each async streaming
+    response, on a new loop that async_to_sync closes when the call returns.
+    A client or semaphore bound to such a loop would pool and bound nothing,
+    and its connections would be left open, so async callers use the sync
+    client and upstream_slot() from a thread there.
+    """
+    return serving_asgi()
+
+
+def get_async_openai_client():
+    """
+    Return the shared asynchronous OpenAI client for the running event loop.
+
+    httpx async connection pools are bound to the loop they were created on,
+    so there is one client per loop (normally one per ASGI worker). Only use
+    it if has_long_lived_loop().
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = openai.AsyncOpenAI(
+            api_key=settings.OPENAI_API_KEY,
+            base_url=settings.OPENAI_BASE_URL,
+            timeout=_timeout(),
+            max_retries=settings.OPENAI_MAX_RETRIES,
+            http_client=httpx.AsyncClient(timeout=_timeout(), limits=_limits()),
+        )
+        _async_clients[loop] = client
+    return client
+
+
+def reset_clients():
+    """
+    Drop the shared clients and slots so they are rebuilt from the current
+    settings on next use (for the benchmarks, which point them at a stub).
+    """
+    global _client, _slots
+    with _lock:
+        if _client is not None:
+            _client.close()
+        _client = None
+        _slots = None
+        _async_clients.clear()
+        _async_slots.clear()
+
+
+@contextmanager
+def upstream_slot():
+    """
+    Hold one of OPENAI_MAX_CONCURRENCY upstream slots of this process.
+
+    Bounding in-flight calls keeps a slow upstream from tying up every worker
+    thread; callers wait at most OPENAI_QUEUE_TIMEOUT seconds for a slot.
+    """
+    global _slots
+    if _slots is None:
+        with _lock:
+            if _slots is None:
+                _slots = threading.BoundedSemaphore(settings.OPENAI_MAX_CONCURRENCY)
+
+    if not _slots.acquire(timeout=settings.OPENAI_QUEUE_TIMEOUT):
+        raise UpstreamBusy("Too many requests in progress, please try again shortly.")
+    try:
+        yield
+    finally:
+        _slots.release()
+
+
+@asynccontextmanager
+async def async_upstream_slot():
+    """Async counterpart of upstream_slot() for the running event loop"""
+    loop = asyncio.get_running_loop()
+    slots = _async_slots.get(loop)
+    if slots is None:
+        slots = _async_slots[loop] = asyncio.Semaphore(settings.OPENAI_MAX_CONCURRENCY)
+
+    try:
+        await asyncio.wait_for(slots.acquire(), settings.OPENAI_QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise UpstreamBusy("Too many requests in progress, please try again shortly.")
+    try:
+        yield
+    finally:
+        slots.release()
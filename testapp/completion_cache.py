@@ -0,0 +1,72 @@
+import hashlib
+import json
+import re
+
+from django.conf import settings
+from django.core.cache import caches
+
+# Opt-in cache of chat completions (CHATBOT_COMPLETION_CACHE_ENABLED).
+# Entries live in the 'completions' cache alias, which sets the TTL and the
+# maximum number of entries; the local-memory backend evicts least recently
+# used entries first.
+
+HITS_KEY = 'completion-cache:hits'
+MISSES_KEY = 'completion-cache:misses'
+
+_whitespace = re.compile(r'\s+')
+
+
+def _cache():
+    return caches['completions']
+
+
+def is_enabled():
+    return settings.CHATBOT_COMPLETION_CACHE_ENABLED
+
+
+def make_key(model, params, messages):
+    """
+    Hash the model, request parameters and message list.
+
+    Message contents are normalized (surrounding whitespace stripped, runs of
+    whitespace collapsed) so trivially different prompts share an entry.
+    """
+    normalized = [
+        (msg["role"], _whitespace.sub(' ', msg["content"]).strip())
+        for msg in messages
+    ]
+    payload = json.dumps(
+        {"model": model, "params": params, "messages": normalized},
+        sort_keys=True,
+    )
+    return 'completion:' + hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _count(key):
+    cache = _cache()
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Evicted between add() and incr()
+        cache.set(key, 1, timeout=None)
+
+
+def lookup(key):
+    """Return the cached completion for key, or None, and count the hit or miss"""
+    content = _cache().get(key)
+    _count(HITS_KEY if content is not None else MISSES_KEY)
+    return content
+
+
+def store(key, content):
+    _cache().set(key, content)
+
+
+def stats():
+    """Return the hit and miss counters"""
+    counters = _cache().get_many([HITS_KEY, MISSES_KEY])
+    return {
+        "hits": counters.get(HITS_KEY, 0),
+        "misses": counters.get(MISSES_KEY, 0),
+    }
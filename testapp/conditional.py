@@ -0,0 +1,58 @@
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers, quote_etag
+from django.utils.http import http_date
+
+# Conditional GET for the conversation endpoints.
+# A conversation's version is its last_message_at, which ChatbotService
+# updates whenever it saves messages; a user's conversation list's version
+# is the newest of those and the number of conversations. Both come from the
+# Conversation table alone, so a request whose If-None-Match or
+# If-Modified-Since is still current gets a 304 without reading messages.
+# Responses are marked private, no-cache: browsers keep them but revalidate
+# on every use.
+
+_LIST_VERSION = {'count': Count('id'), 'last_message_at': Max('last_message_at')}
+
+
+def _version(key, last_message_at):
+    if last_message_at is None:
+        return quote_etag(key), None
+    timestamp = last_message_at.timestamp()
+    return quote_etag(f"{key}-{timestamp:.6f}"), int(timestamp)
+
+
+def conversation_version(conversation):
+    """(ETag, Last-Modified timestamp) of one conversation"""
+    return _version(f"c{conversation.id}", conversation.last_message_at)
+
+
+def list_version(conversations):
+    """(ETag, Last-Modified timestamp) of a queryset of conversations, in one aggregate query"""
+    stamp = conversations.aggregate(**_LIST_VERSION)
+    return _version(f"l{stamp['count']}", stamp['last_message_at'])
+
+
+async def alist_version(conversations):
+    """Async version of list_version"""
+    stamp = await conversations.aaggregate(**_LIST_VERSION)
+    return _version(f"l{stamp['count']}", stamp['last_message_at'])
+
+
+def add_validators(response, version):
+    """Set the ETag, Last-Modified and caching headers of a response for ``version``"""
+    etag, last_modified = version
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ['Authorization'])
+    return response
+
+
+def not_modified(request, version):
+    """A 304 response if the request's validators match ``version``, else None"""
+    etag, last_modified = version
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        return None
+    return add_validators(response, version)
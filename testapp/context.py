@@ -0,0 +1,129 @@
+import logging
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_tokens(text):
+    """Rough token count for budgeting (about four characters per token)"""
+    return len(text) // 4 + 1
+
+
+class ConversationContextManager:
+    """
+    Build the prompt for a conversation within a token budget.
+
+    Every message is either covered by a rolling summary stored on the
+    Conversation or sent verbatim. The most recent messages not yet in the
+    summary are sent as they are, limited by count and by a token budget.
+    When some no longer fit, they are folded into the summary, together with
+    the oldest messages of the window up to CHATBOT_SUMMARY_BATCH_SIZE, so
+    that the next few turns fit again without another summary call. Only the
+    new messages are sent to be summarized, along with the previous summary.
+    """
+
+    def __init__(self, summarize, system_prompt):
+        # summarize(previous_summary, messages) -> new summary text
+        self.summarize = summarize
+        self.system_prompt = system_prompt
+        self.max_messages = settings.CHATBOT_CONTEXT_MAX_MESSAGES
+        self.max_tokens = settings.CHATBOT_CONTEXT_MAX_TOKENS
+        self.summary_max_tokens = settings.CHATBOT_SUMMARY_MAX_TOKENS
+        self.summary_batch_size = settings.CHATBOT_SUMMARY_BATCH_SIZE
+        # Set when build_messages() changed the summary; the caller saves it
+        self.summary_updated = False
+
+    def unsummarized(self, conversation):
+        """The conversation's messages that are not covered by its summary"""
+        messages = conversation.messages.all()
+        if conversation.summarized_through is not None:
+            messages = messages.filter(id__gt=conversation.summarized_through)
+        return messages
+
+    def recent_window(self, conversation, max_messages, max_tokens):
+        """
+        Return the most recent messages of the conversation not yet in its
+        summary, oldest first, limited by count and by an approximate token
+        budget.
+
+        This is a single reverse-ordered query on the (conversation, created_at)
+        index, so its cost does not depend on the length of the conversation.
+        """
+        recent = self.unsummarized(conversation).order_by('-created_at', '-id').only(
+            'conversation', 'content', 'is_user'
+        )[:max_messages]
+
+        window = []
+        used_tokens = 0
+        for msg in recent:
+            cost = estimate_tokens(msg.content)
+            if used_tokens + cost > max_tokens:
+                break
+            window.append(msg)
+            used_tokens += cost
+
+        window.reverse()
+        return window
+
+    def update_summary(self, conversation, window):
+        """
+        Fold messages that did not fit in the window into the conversation
+        summary, and return the messages to send verbatim.
+
+        The new summary is set on ``conversation`` but not saved.
+        """
+        dropped = self.unsummarized(conversation)
+        if window:
+            dropped = dropped.filter(id__lt=window[0].id)
+        # Normally only the last turn or two has dropped out, but a
+        # conversation that grew before it had a summary can have a long
+        # history: only its newest batch is summarized, to bound the cost
+        dropped = list(dropped.order_by('-created_at', '-id')[:self.summary_batch_size])
+        if not dropped:
+            return window
+        dropped.reverse()
+
+        # Summarizing is an upstream call made before the reply, so a whole
+        # batch is folded in at once rather than a turn at a time
+        folded = max(0, self.summary_batch_size - len(dropped))
+        batch = dropped + window[:folded]
+        try:
+            summary = self.summarize(conversation.summary, batch)
+        except Exception:
+            # Keep the previous summary and send these turns as they are,
+            # over the budget; they are retried next time
+            logger.warning("Could not summarize conversation %s", conversation.id, exc_info=True)
+            return dropped + window
+
+        conversation.summary = summary
+        conversation.summarized_through = batch[-1].id
+        self.summary_updated = True
+        return window[folded:]
+
+    def build_messages(self, conversation, message_text):
+        """
+        Return the OpenAI message list for the next completion, ending with
+        the new (not yet saved) user message.
+        """
+        # Part of the budget is reserved for the summary, which covers every
+        # message that is not sent verbatim
+        window = self.recent_window(
+            conversation,
+            self.max_messages - 1,
+            self.max_tokens - self.summary_max_tokens - estimate_tokens(message_text),
+        )
+        window = self.update_summary(conversation, window)
+
+        messages = [{"role": "system", "content": self.system_prompt}]
+        if conversation.summary:
+            messages.append({
+                "role": "system",
+                "content": f"Summary of the earlier conversation: {conversation.summary}",
+            })
+
+        for msg in window:
+            role = "user" if msg.is_user else "assistant"
+            messages.append({"role": role, "content": msg.content})
+        messages.append({"role": "user", "content": message_text})
+        return messages
@@ -0,0 +1,103 @@
+from asgiref.sync import sync_to_async
+from django.utils.text import compress_sequence
+from rest_framework.utils.encoders import JSONEncoder
+
+from .archive import ARCHIVED_FIELDS, archived_messages
+from .models import Message
+
+# Streaming NDJSON export of conversations, for the export endpoint and
+# `manage.py export_conversations`. The output is one JSON object per line:
+# a "conversation" record followed by a "message" record per message of
+# that conversation, oldest first. Conversations and messages are read with
+# two iterator() queries walked side by side in conversation id order, so
+# memory use does not depend on the size of the export. Under ASGI the
+# chunks are produced in a thread with aiterate(), as Django would read a
+# sync iterator into memory before sending the first one.
+
+CHUNK_SIZE = 2000  # Rows fetched per round trip
+BUFFER_SIZE = 64 * 1024  # Bytes of output written (and compressed) at once
+
+# Formats datetimes like the API responses
+_encoder = JSONEncoder(ensure_ascii=False)
+
+
+def conversation_record(conversation):
+    return {
+        "type": "conversation",
+        "id": conversation.id,
+        "user": conversation.user.username,
+        "created_at": conversation.created_at,
+    }
+
+
+def message_record(conversation_id, values):
+    record = {"type": "message", "conversation_id": conversation_id}
+    record.update(zip(ARCHIVED_FIELDS, values))
+    return record
+
+
+def export_records(conversations, chunk_size=CHUNK_SIZE):
+    """Yield the records of ``conversations`` (a Conversation queryset) and their messages"""
+    conversations = (
+        conversations.select_related('user', 'archive')
+        .defer('archive__data')  # Loaded only for the archived conversations
+        .order_by('id')
+    )
+    messages = (
+        Message.objects.filter(conversation__in=conversations.values('id'))
+        .order_by('conversation_id', 'created_at', 'id')
+        .values_list('conversation_id', *ARCHIVED_FIELDS)
+        .iterator(chunk_size=chunk_size)
+    )
+
+    pending = next(messages, None)
+    for conversation in conversations.iterator(chunk_size=chunk_size):
+        yield conversation_record(conversation)
+
+        archived = archived_messages(conversation)
+        if archived is not None:
+            for message in archived:
+                yield message_record(conversation.id, [getattr(message, field) for field in ARCHIVED_FIELDS])
+
+        # Skip messages of conversations created after the export started
+        while pending is not None and pending[0] < conversation.id:
+            pending = next(messages, None)
+        while pending is not None and pending[0] == conversation.id:
+            yield message_record(conversation.id, pending[1:])
+            pending = next(messages, None)
+
+
+def export_ndjson(conversations, chunk_size=CHUNK_SIZE):
+    """Yield the NDJSON export of ``conversations`` in chunks of about BUFFER_SIZE bytes"""
+    buffer = []
+    size = 0
+    for record in export_records(conversations, chunk_size):
+        line = _encoder.encode(record).encode() + b"\n"
+        buffer.append(line)
+        size += len(line)
+        if size >= BUFFER_SIZE:
+            yield b"".join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+def export_ndjson_gzip(conversations, chunk_size=CHUNK_SIZE):
+    """export_ndjson(), gzip-compressed as it is produced"""
+    return compress_sequence(export_ndjson(conversations, chunk_size))
+
+
+async def aiterate(chunks):
+    """
+    Iterate ``chunks`` (a sync generator) from async code, producing each
+    chunk in the thread sync_to_async() runs the request's sync code in, so
+    the database cursors stay on one thread
+    """
+    produce = sync_to_async(next)
+    try:
+        while (chunk := await produce(chunks, None)) is not None:
+            yield chunk
+    finally:
+        # Close the cursors if the client went away
+        await sync_to_async(chunks.close)()
@@ -0,0 +1,97 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import (
+    Argon2PasswordHasher, ScryptPasswordHasher, check_password, make_password
+)
+
+# Password hashers with parameters taken from settings (PASSWORD_SCRYPT_*,
+# PASSWORD_ARGON2_*), and a bounded pool to hash in from async views.
+# Django rehashes a password on the next successful login whenever its hash
+# was made by another hasher or with other parameters, so changing
+# PASSWORD_HASHER or the parameters migrates users transparently.
+
+
+class TunedScryptPasswordHasher(ScryptPasswordHasher):
+    """scrypt, the default: memory-hard and several times cheaper in CPU than PBKDF2"""
+
+    @property
+    def work_factor(self):
+        return settings.PASSWORD_SCRYPT_WORK_FACTOR
+
+    @property
+    def block_size(self):
+        return settings.PASSWORD_SCRYPT_BLOCK_SIZE
+
+    @property
+    def parallelism(self):
+        return settings.PASSWORD_SCRYPT_PARALLELISM
+
+    @property
+    def maxmem(self):
+        # scrypt needs 128 * N * r * p bytes; OpenSSL's default cap is 32 MiB
+        return 2 * 128 * self.work_factor * self.block_size * self.parallelism
+
+
+class TunedArgon2PasswordHasher(Argon2PasswordHasher):
+    """Argon2id; requires the argon2-cffi package"""
+
+    @property
+    def time_cost(self):
+        return settings.PASSWORD_ARGON2_TIME_COST
+
+    @property
+    def memory_cost(self):
+        return settings.PASSWORD_ARGON2_MEMORY_COST
+
+    @property
+    def parallelism(self):
+        return settings.PASSWORD_ARGON2_PARALLELISM
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.PASSWORD_HASHING_WORKERS,
+                    thread_name_prefix='password-hashing',
+                )
+    return _executor
+
+
+async def _run_hashing(func, *args):
+    """
+    Run CPU-heavy hashing on the bounded pool.
+
+    hashlib releases the GIL while hashing, so the workers run in parallel
+    while the event loop keeps serving requests. The pool size also caps the
+    memory scrypt/Argon2 use at once.
+    """
+    return await asyncio.get_running_loop().run_in_executor(_get_executor(), func, *args)
+
+
+async def ahash_password(password):
+    """make_password() on the hashing pool"""
+    return await _run_hashing(make_password, password)
+
+
+async def acheck_user_password(user, password):
+    """
+    Check a user's password on the hashing pool, like User.check_password.
+
+    If the hash is outdated it is replaced and saved, as Django does on login.
+    """
+    outdated = []
+    valid = await _run_hashing(check_password, password, user.password, outdated.append)
+    if valid and outdated:
+        user.password = await ahash_password(password)
+        await user.asave(update_fields=['password'])
+    return valid
@@ -0,0 +1,151 @@
+from collections import Counter
+
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Conversation, Message
+
+# Bulk import of conversation history in the NDJSON format of export.py,
+# for `manage.py import_conversations`: a "conversation" record followed by
+# the "message" records of that conversation. Rows are collected in memory
+# and written with bulk_create by flush(), one transaction per call; the
+# command calls it every --chunk-size records and checkpoints in between.
+# Imported rows get new ids; their timestamps are kept.
+
+BATCH_SIZE = 500  # Rows per INSERT
+
+
+def _timestamp(value):
+    if value is None:
+        return timezone.now()
+    timestamp = parse_datetime(value)
+    if timestamp is None:
+        raise ValueError(f"invalid timestamp {value!r}")
+    if timezone.is_naive(timestamp):
+        timestamp = timezone.make_aware(timestamp)
+    return timestamp
+
+
+class ConversationImporter:
+    """
+    Turn export records into Conversation and Message rows.
+
+    ``user``, if given, receives every conversation; otherwise each goes to
+    the user named in its record, who is created (without a usable
+    password) if ``create_users`` is set.
+    """
+
+    def __init__(self, user=None, create_users=False, batch_size=BATCH_SIZE):
+        self.user = user
+        self.create_users = create_users
+        self.batch_size = batch_size
+        self.users = {}
+        # The conversation being imported: (its id in the file, Conversation)
+        self.current = None
+        self.conversations = []
+        self.messages = []
+        self.imported_conversations = 0
+        self.imported_messages = 0
+
+    @property
+    def pending(self):
+        return len(self.conversations) + len(self.messages)
+
+    def get_user(self, username):
+        if self.user is not None:
+            return self.user
+        if not username:
+            raise ValueError("conversation record without a user")
+        user = self.users.get(username)
+        if user is None:
+            user = User.objects.filter(username=username).first()
+            if user is None:
+                if not self.create_users:
+                    raise ValueError(f"unknown user {username!r}")
+                user = User.objects.create_user(username)
+            self.users[username] = user
+        return user
+
+    def add(self, record):
+        """Queue the rows of one record; raises ValueError or KeyError if it is invalid"""
+        kind = record.get('type')
+        if kind == 'conversation':
+            created_at = _timestamp(record.get('created_at'))
+            conversation = Conversation(
+                user=self.get_user(record.get('user')),
+                created_at=created_at,
+                last_message_at=created_at,
+            )
+            self.conversations.append(conversation)
+            self.current = (record['id'], conversation)
+        elif kind == 'message':
+            if self.current is None or record['conversation_id'] != self.current[0]:
+                raise ValueError(
+                    f"message of conversation {record['conversation_id']!r} is not "
+                    "right after that conversation's record"
+                )
+            conversation = self.current[1]
+            created_at = _timestamp(record.get('created_at'))
+            content = record['content']
+            conversation.message_count += 1
+            if created_at >= conversation.last_message_at:
+                conversation.last_message_at = created_at
+                conversation.last_message_preview = content[:100]
+            self.messages.append(Message(
+                conversation=conversation,
+                content=content,
+                is_user=bool(record['is_user']),
+                created_at=created_at,
+                model=record.get('model') or '',
+                prompt_tokens=record.get('prompt_tokens'),
+                completion_tokens=record.get('completion_tokens'),
+                latency_ms=record.get('latency_ms'),
+                finish_reason=record.get('finish_reason') or '',
+            ))
+        else:
+            raise ValueError(f"unknown record type {kind!r}")
+
+    def _insert(self, model, rows):
+        # auto_now_add overwrites created_at on insert; put the imported times
+        # back with one executemany(), which costs a fraction of bulk_update()
+        # and its CASE expression per row
+        created_at = [row.created_at for row in rows]
+        model.objects.bulk_create(rows, batch_size=self.batch_size)
+
+        field = model._meta.get_field('created_at')
+        quote = connection.ops.quote_name
+        sql = (
+            f"UPDATE {quote(model._meta.db_table)} SET {quote(field.column)} = %s "
+            f"WHERE {quote(model._meta.pk.column)} = %s"
+        )
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, [
+                (field.get_db_prep_value(timestamp, connection), row.pk)
+                for row, timestamp in zip(rows, created_at)
+            ])
+        for row, timestamp in zip(rows, created_at):
+            row.created_at = timestamp
+
+    def flush(self):
+        """Insert the queued rows in one transaction"""
+        # A conversation saved by a previous flush whose messages continue here
+        continued = Counter(
+            message.conversation for message in self.messages if message.conversation.pk is not None
+        )
+        with transaction.atomic():
+            # Conversations first, so the messages get their ids
+            self._insert(Conversation, self.conversations)
+            self._insert(Message, self.messages)
+            for conversation, count in continued.items():
+                Conversation.objects.filter(pk=conversation.pk).update(
+                    message_count=F('message_count') + count,
+                    last_message_at=conversation.last_message_at,
+                    last_message_preview=conversation.last_message_preview,
+                )
+        self.imported_conversations += len(self.conversations)
+        self.imported_messages += len(self.messages)
+        self.conversations = []
+        self.messages = []
@@ -0,0 +1,131 @@
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import ChatJob, Conversation
+from .services import ChatbotService
+
+logger = logging.getLogger(__name__)
+
+# Database-backed queue of chat completions.
+# Any number of worker threads, in the web processes (CHATBOT_JOB_WORKERS)
+# or in `manage.py run_chat_worker` processes, claim jobs with a conditional
+# UPDATE, so no external broker is needed and a job runs only once. The total
+# number of worker threads is the global cap on queued upstream calls.
+
+_wakeup = threading.Event()
+_pool_lock = threading.Lock()
+_pool_started = False
+
+
+def enqueue(user, message_text, conversation_id=None):
+    """Queue a chat completion and return the ChatJob"""
+    conversation = None
+    if conversation_id:
+        # Same rule as ChatbotService: an unknown conversation starts a new one
+        conversation = Conversation.objects.filter(id=conversation_id, user=user).first()
+
+    job = ChatJob.objects.create(user=user, conversation=conversation, message=message_text)
+    start_worker_pool()
+    _wakeup.set()
+    return job
+
+
+def claim_next():
+    """
+    Claim the oldest runnable job for this worker, or return None.
+
+    Jobs whose worker died (and so stopped refreshing heartbeat_at) are
+    claimable again after CHATBOT_JOB_STALE_AFTER seconds. A live worker
+    keeps its claim however long the upstream calls take.
+    """
+    stale_before = timezone.now() - timedelta(seconds=settings.CHATBOT_JOB_STALE_AFTER)
+    runnable = Q(status=ChatJob.PENDING) | Q(status=ChatJob.RUNNING, heartbeat_at__lt=stale_before)
+
+    for job in ChatJob.objects.filter(runnable).order_by('created_at', 'id')[:10]:
+        # Only one worker's UPDATE can match the row in the state it was read in
+        now = timezone.now()
+        claimed = ChatJob.objects.filter(
+            id=job.id, status=job.status, started_at=job.started_at
+        ).update(status=ChatJob.RUNNING, started_at=now, heartbeat_at=now)
+        if claimed:
+            job.refresh_from_db()
+            return job
+    return None
+
+
+def _claimed(job):
+    """The job, if this worker's claim on it (its started_at) still stands"""
+    return ChatJob.objects.filter(id=job.id, status=ChatJob.RUNNING, started_at=job.started_at)
+
+
+def _heartbeat(job, done):
+    """Refresh the claim on job every CHATBOT_JOB_HEARTBEAT_INTERVAL seconds until done is set"""
+    try:
+        while not done.wait(settings.CHATBOT_JOB_HEARTBEAT_INTERVAL):
+            if not _claimed(job).update(heartbeat_at=timezone.now()):
+                return
+    finally:
+        connection.close()
+
+
+def run_job(job):
+    """Run a claimed job and record its result, unless another worker has taken it over"""
+    done = threading.Event()
+    threading.Thread(
+        target=_heartbeat, args=(job, done), name=f"chat-job-{job.id}-heartbeat", daemon=True
+    ).start()
+    try:
+        response = ChatbotService().get_chat_response(
+            user=job.user,
+            message_text=job.message,
+            conversation_id=job.conversation_id
+        )
+    except Exception as e:
+        logger.exception("Chat job %s failed", job.id)
+        result = {"status": ChatJob.FAILED, "error": str(e)}
+    else:
+        result = {
+            "status": ChatJob.DONE,
+            "conversation_id": response["conversation_id"],
+            "result": response["message"],
+        }
+    finally:
+        done.set()
+
+    if not _claimed(job).update(finished_at=timezone.now(), **result):
+        logger.warning("Chat job %s was claimed by another worker before it finished", job.id)
+
+
+def work(stop=None):
+    """Claim and run jobs until ``stop`` is set"""
+    stop = stop or threading.Event()
+    try:
+        while not stop.is_set():
+            close_old_connections()
+            job = claim_next()
+            if job is None:
+                _wakeup.wait(settings.CHATBOT_JOB_POLL_INTERVAL)
+                _wakeup.clear()
+                continue
+            run_job(job)
+    finally:
+        connection.close()
+
+
+def start_worker_pool():
+    """Start this process's CHATBOT_JOB_WORKERS worker threads, once"""
+    global _pool_started
+    if _pool_started or settings.CHATBOT_JOB_WORKERS <= 0:
+        return
+    with _pool_lock:
+        if _pool_started:
+            return
+        for i in range(settings.CHATBOT_JOB_WORKERS):
+            threading.Thread(target=work, name=f"chat-job-worker-{i}", daemon=True).start()
+        _pool_started = True
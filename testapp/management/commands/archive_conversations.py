@@ -0,0 +1,49 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from testapp.archive import archive_conversation, idle_conversations, idle_cutoff
+
+
+class Command(BaseCommand):
+    help = (
+        "Move the messages of conversations idle for --days into compressed "
+        "archives. Run it from cron, or with --loop to keep it running."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.CHATBOT_ARCHIVE_AFTER_DAYS,
+                            help="Archive conversations whose newest message is older than this")
+        parser.add_argument('--limit', type=int, default=1000, help="Most conversations archived per run")
+        parser.add_argument('--loop', action='store_true', help="Run again every --interval seconds")
+        parser.add_argument('--interval', type=int, default=3600, help="Seconds between runs with --loop")
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                self.archive(options['days'], options['limit'])
+                if not options['loop']:
+                    break
+                close_old_connections()
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+
+    def archive(self, days, limit):
+        conversations = messages = raw_size = compressed_size = 0
+        cutoff = idle_cutoff(days)
+        for conversation in idle_conversations(days)[:limit]:
+            # Skipped if a turn was saved since the query
+            archived, raw, compressed = archive_conversation(conversation, idle_before=cutoff)
+            if archived:
+                conversations += 1
+                messages += archived
+                raw_size += raw
+                compressed_size += compressed
+
+        self.stdout.write(
+            f"Archived {conversations} conversations ({messages} messages): "
+            f"{raw_size // 1024} KiB of JSON stored in {compressed_size // 1024} KiB"
+        )
@@ -0,0 +1,190 @@
+import itertools
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from rest_framework.authtoken.models import Token
+
+from testapp.benchmarking import benchmark_database, latency_summary, stub_upstream, write_results
+from testapp.models import Conversation, Message
+
+PASSWORD = 'Bench-password-1!'
+
+
+class QueryCounter:
+    """Execute wrapper counting the queries of the current thread's connection"""
+
+    def __init__(self):
+        self.queries = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries += 1
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure latency percentiles, throughput and queries per request of "
+        "the main API endpoints on a seeded database, against a local OpenAI "
+        "stub, and optionally write the results as JSON for comparing commits."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50, help="Users to seed")
+        parser.add_argument('--conversations', type=int, default=10, help="Conversations per user")
+        parser.add_argument('--messages', type=int, default=40, help="Messages per conversation")
+        parser.add_argument('--requests', type=int, default=200, help="Requests per endpoint")
+        parser.add_argument('--auth-requests', type=int, default=50,
+                            help="Requests for the login and register endpoints, which hash passwords")
+        parser.add_argument('--threads', type=int, default=8, help="Concurrent client threads")
+        parser.add_argument('--latency', type=float, default=0.05, help="Stub completion latency in seconds")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed for picking users and conversations")
+        parser.add_argument('--output', help="Write JSON results to this file")
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        threads = options['threads']
+
+        with benchmark_database(), stub_upstream(
+            options['latency'],
+            CHAT_THROTTLE_BURST=10 ** 9,
+            CHAT_MAX_INFLIGHT=threads,
+            OPENAI_MAX_CONCURRENCY=threads,
+        ):
+            self.seed(options['users'], options['conversations'], options['messages'])
+
+            requests = options['requests']
+            auth_requests = options['auth_requests']
+            results = {
+                "chat_message": self.run(self.chat_message, requests, threads),
+                "get_conversations": self.run(self.get_conversations, requests, threads),
+                "get_conversation": self.run(self.get_conversation, requests, threads),
+                "login": self.run(self.login, auth_requests, threads),
+                "register": self.run(self.register, auth_requests, threads),
+                "async_login": self.run(self.async_login, auth_requests, threads),
+                "async_register": self.run(self.async_register, auth_requests, threads),
+            }
+
+        for name, summary in results.items():
+            self.stdout.write(
+                f"{name:>17}: {summary['throughput_rps']} req/s, p50 {summary['p50_ms']} ms, "
+                f"p95 {summary['p95_ms']} ms, p99 {summary['p99_ms']} ms, "
+                f"{summary['queries_per_request']} queries/req, {summary['errors']} errors"
+            )
+        if options['output']:
+            parameters = {
+                k: options[k] for k in (
+                    'users', 'conversations', 'messages', 'requests', 'auth_requests',
+                    'threads', 'latency', 'seed',
+                )
+            }
+            write_results(options['output'], 'api', results, parameters)
+
+    def seed(self, users, conversations, messages):
+        """Bulk-create users with tokens, conversations and messages"""
+        password = make_password(PASSWORD)  # Hash once, not per user
+        User.objects.bulk_create(
+            User(username=f'bench{i}', email=f'bench{i}@example.com', password=password)
+            for i in range(users)
+        )
+        self.users = list(User.objects.order_by('id'))
+        self.tokens = {
+            token.user_id: f"Token {token.key}"
+            for token in Token.objects.bulk_create(
+                Token(key=Token.generate_key(), user=user) for user in self.users
+            )
+        }
+        Conversation.objects.bulk_create(
+            Conversation(
+                user=user,
+                message_count=messages,
+                last_message_preview=f"Seeded message {messages - 1}" if messages else '',
+            )
+            for user in self.users for _ in range(conversations)
+        )
+        self.conversations = list(Conversation.objects.values_list('id', 'user_id'))
+        for conversation_id, user_id in self.conversations:
+            Message.objects.bulk_create(
+                Message(conversation_id=conversation_id, content=f"Seeded message {i}", is_user=i % 2 == 0)
+                for i in range(messages)
+            )
+        self._usernames = itertools.count()
+
+    def run(self, request, count, threads):
+        """Make ``count`` requests from ``threads`` threads and summarize them"""
+        def timed_request(_):
+            # Server errors (e.g. "database is locked") become 500s, counted in "errors"
+            client = Client(raise_request_exception=False)
+            counter = QueryCounter()
+            with connection.execute_wrapper(counter):
+                start = time.perf_counter()
+                ok = request(client)
+                elapsed = time.perf_counter() - start
+            return elapsed, counter.queries, ok
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            samples = list(pool.map(timed_request, range(count)))
+        elapsed = time.perf_counter() - start
+        connection.close()
+
+        summary = latency_summary([sample[0] for sample in samples], elapsed)
+        queries = [sample[1] for sample in samples]
+        summary["queries_per_request"] = round(sum(queries) / len(queries), 2) if queries else None
+        summary["max_queries"] = max(queries, default=None)
+        summary["errors"] = sum(1 for sample in samples if not sample[2])
+        return summary
+
+    def pick_conversation(self):
+        conversation_id, user_id = self.random.choice(self.conversations)
+        return conversation_id, self.tokens[user_id]
+
+    def chat_message(self, client):
+        conversation_id, auth = self.pick_conversation()
+        response = client.post(
+            '/api/chat/message/', {'message': 'Hello', 'conversation_id': conversation_id},
+            content_type='application/json', HTTP_AUTHORIZATION=auth
+        )
+        return response.status_code == 200
+
+    def get_conversations(self, client):
+        auth = self.tokens[self.random.choice(self.users).id]
+        response = client.get('/api/chat/conversations/', HTTP_AUTHORIZATION=auth)
+        return response.status_code == 200
+
+    def get_conversation(self, client):
+        conversation_id, auth = self.pick_conversation()
+        response = client.get(f'/api/chat/conversations/{conversation_id}/', HTTP_AUTHORIZATION=auth)
+        return response.status_code == 200
+
+    def login(self, client, path='/api/login/'):
+        user = self.random.choice(self.users)
+        response = client.post(
+            path, {'username': user.username, 'password': PASSWORD},
+            content_type='application/json'
+        )
+        return response.status_code == 200
+
+    def register(self, client, path='/api/register/'):
+        username = f'new{next(self._usernames)}'
+        response = client.post(
+            path, {
+                'username': username,
+                'email': f'{username}@example.com',
+                'password': PASSWORD,
+                'password2': PASSWORD,
+            },
+            content_type='application/json'
+        )
+        return response.status_code == 201
+
+    def async_login(self, client):
+        return self.login(client, '/api/async/login/')
+
+    def async_register(self, client):
+        return self.register(client, '/api/async/register/')
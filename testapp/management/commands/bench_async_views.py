@@ -0,0 +1,96 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient, Client
+from rest_framework.authtoken.models import Token
+
+from testapp.benchmarking import benchmark_database, latency_summary, stub_upstream, write_results
+from testapp.clients import serve_asgi
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare chat_message throughput of the sync DRF view (on a pool of "
+        "worker threads, like a threaded WSGI worker) with the async view (on "
+        "one event loop, like an ASGI worker) against a local OpenAI stub."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help="Chat turns per run")
+        parser.add_argument('--threads', type=int, default=8, help="Worker threads for the sync run")
+        parser.add_argument('--concurrency', type=int, default=100, help="In-flight requests for the async run")
+        parser.add_argument('--latency', type=float, default=0.5, help="Stub completion latency in seconds")
+        parser.add_argument('--output', help="Write JSON results to this file")
+
+    def handle(self, *args, **options):
+        concurrency = max(options['concurrency'], options['threads'])
+        with benchmark_database(), stub_upstream(
+            options['latency'],
+            # One user sends every request; measure the views, not the throttle
+            CHAT_THROTTLE_BURST=10 ** 9,
+            CHAT_MAX_INFLIGHT=concurrency,
+            OPENAI_MAX_CONCURRENCY=options['concurrency'],
+            OPENAI_MAX_CONNECTIONS=options['concurrency'],
+        ):
+            user = User.objects.create_user(username='bench', password='bench')
+            token = Token.objects.create(user=user)
+            auth = f"Token {token.key}"
+
+            results = {
+                "sync": self.run_sync(auth, options['requests'], options['threads']),
+                "async": self.run_async(auth, options['requests'], options['concurrency']),
+            }
+
+        for name, summary in results.items():
+            self.stdout.write(
+                f"{name:>5}: {summary['throughput_rps']} req/s, "
+                f"p50 {summary['p50_ms']} ms, p99 {summary['p99_ms']} ms"
+            )
+        if options['output']:
+            parameters = {k: options[k] for k in ('requests', 'threads', 'concurrency', 'latency')}
+            write_results(options['output'], 'async_views', results, parameters)
+
+    def run_sync(self, auth, requests, threads):
+        def chat_turn(_):
+            client = Client()
+            start = time.perf_counter()
+            response = client.post(
+                '/api/chat/message/', {'message': 'Hello'},
+                content_type='application/json', HTTP_AUTHORIZATION=auth
+            )
+            assert response.status_code == 200, response.content
+            return time.perf_counter() - start
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            latencies = list(pool.map(chat_turn, range(requests)))
+        return latency_summary(latencies, time.perf_counter() - start)
+
+    def run_async(self, auth, requests, concurrency):
+        async def run():
+            client = AsyncClient()
+            slots = asyncio.Semaphore(concurrency)
+
+            async def chat_turn():
+                async with slots:
+                    start = time.perf_counter()
+                    response = await client.post(
+                        '/api/async/chat/message/', {'message': 'Hello'},
+                        content_type='application/json', headers={'Authorization': auth}
+                    )
+                    assert response.status_code == 200, response.content
+                    return time.perf_counter() - start
+
+            return await asyncio.gather(*(chat_turn() for _ in range(requests)))
+
+        # As under an ASGI server (practiceproject/asgi.py)
+        serve_asgi()
+        try:
+            start = time.perf_counter()
+            latencies = asyncio.run(run())
+        finally:
+            serve_asgi(False)
+        return latency_summary(latencies, time.perf_counter() - start)
@@ -0,0 +1,77 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from testapp.benchmarking import benchmark_database, stub_upstream, write_results
+from testapp.services import ChatbotService
+
+WRITE_PREFIXES = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+
+class WriteCounter:
+    """
+    Execute wrapper counting write statements and the transactions (fsyncs
+    on SQLite) they commit in: one per autocommitted write plus one per
+    explicit transaction.
+    """
+
+    def __init__(self):
+        self.writes = 0
+        self.transactions = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        statement = sql.lstrip().upper()
+        if statement.startswith('BEGIN'):
+            self.transactions += 1
+        elif statement.startswith(WRITE_PREFIXES):
+            self.writes += 1
+            if not connection.in_atomic_block:
+                self.transactions += 1
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure database writes and transactions per chat turn, and chat "
+        "turns per second, against a zero-latency local OpenAI stub."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--turns', type=int, default=500, help="Chat turns to run")
+        parser.add_argument('--turns-per-conversation', type=int, default=10)
+        parser.add_argument('--output', help="Write JSON results to this file")
+
+    def handle(self, *args, **options):
+        turns = options['turns']
+        per_conversation = options['turns_per_conversation']
+
+        with benchmark_database(), stub_upstream(0):
+            user = User.objects.create_user(username='bench', password='bench')
+            chatbot = ChatbotService()
+            counter = WriteCounter()
+
+            conversation_id = None
+            start = time.perf_counter()
+            with connection.execute_wrapper(counter):
+                for turn in range(turns):
+                    if turn % per_conversation == 0:
+                        conversation_id = None
+                    response = chatbot.get_chat_response(user, f"Message {turn}", conversation_id)
+                    conversation_id = response['conversation_id']
+            elapsed = time.perf_counter() - start
+
+        results = {
+            "turns": turns,
+            "turns_per_s": round(turns / elapsed, 2),
+            "writes_per_turn": round(counter.writes / turns, 2),
+            "transactions_per_turn": round(counter.transactions / turns, 2),
+            "writes_per_s": round(counter.writes / elapsed, 2),
+        }
+        for key, value in results.items():
+            self.stdout.write(f"{key}: {value}")
+        if options['output']:
+            write_results(options['output'], 'chat_writes', results, {
+                'turns': turns, 'turns_per_conversation': per_conversation,
+            })
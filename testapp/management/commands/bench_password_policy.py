@@ -0,0 +1,105 @@
+import re
+import time
+
+from django.contrib.auth.password_validation import (
+    CommonPasswordValidator, MinimumLengthValidator, NumericPasswordValidator
+)
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand
+
+from testapp.benchmarking import write_results
+from testapp.serializers import RegisterSerializer
+from testapp.validators import PasswordPolicyValidator, common_passwords
+
+# Valid, weak and common passwords, in the proportions of a sign-up burst
+PASSWORDS = [
+    'Correct-Horse-9!', 'Tr0ub4dor&3x', 'Sunny.Day.2024', 'N0t-a-common{pw}',
+    'password', 'Password1', '12345678', 'short', 'alllowercase!1', 'ALLUPPER123!',
+]
+
+
+def legacy_checks(password):
+    """The checks the serializers used to run: four re.search calls, stopping at the first failure"""
+    if len(password) < 8:
+        return False
+    if not re.search(r'[A-Z]', password):
+        return False
+    if not re.search(r'[0-9]', password):
+        return False
+    if not re.search(r'[!@#$%^&*(),.?":{}|<>]', password):
+        return False
+    return True
+
+
+class Command(BaseCommand):
+    help = (
+        "Micro-benchmark password policy checks: the old per-rule regexes and "
+        "Django's validators against PasswordPolicyValidator, and the cost of "
+        "validating a registration."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20000, help="Passwords checked per variant")
+        parser.add_argument('--output', help="Write JSON results to this file")
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+
+        django_validators = [MinimumLengthValidator(), CommonPasswordValidator(), NumericPasswordValidator()]
+        policy = PasswordPolicyValidator()
+
+        def run_django_validators(password):
+            for validator in django_validators:
+                try:
+                    validator.validate(password)
+                except ValidationError:
+                    pass
+
+        def run_policy(password):
+            try:
+                policy.validate(password)
+            except ValidationError:
+                pass
+
+        def run_legacy_and_django(password):
+            legacy_checks(password)
+            run_django_validators(password)
+
+        results = {
+            "legacy_regex_checks": self.measure(legacy_checks, iterations),
+            "django_validators": self.measure(run_django_validators, iterations),
+            "legacy_regex_plus_django": self.measure(run_legacy_and_django, iterations),
+            "policy_validator": self.measure(run_policy, iterations),
+            "register_serializer": self.measure(self.validate_registration, iterations // 10),
+        }
+        results["policy_load_ms"] = self.time_list_load()
+
+        for name, value in results.items():
+            if isinstance(value, dict):
+                self.stdout.write(f"{name:>26}: {value['us_per_check']} us/check")
+            else:
+                self.stdout.write(f"{name:>26}: {value}")
+        if options['output']:
+            write_results(options['output'], 'password_policy', results, {'iterations': iterations})
+
+    def measure(self, check, iterations):
+        start = time.perf_counter()
+        for i in range(iterations):
+            check(PASSWORDS[i % len(PASSWORDS)])
+        elapsed = time.perf_counter() - start
+        return {"checks": iterations, "us_per_check": round(elapsed / iterations * 1e6, 2)}
+
+    def validate_registration(self, password):
+        serializer = RegisterSerializer(data={
+            'username': 'newuser',
+            'email': 'newuser@example.com',
+            'password': password,
+            'password2': password,
+        })
+        serializer.is_valid()
+
+    def time_list_load(self):
+        """How long loading the common-password list takes; done once per process"""
+        start = time.perf_counter()
+        common_passwords.__wrapped__()  # Bypass the cache
+        return round((time.perf_counter() - start) * 1000, 2)
@@ -0,0 +1,104 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, close_old_connections, connection
+from django.test.utils import override_settings
+
+from testapp.benchmarking import benchmark_database, write_results
+from testapp.models import Conversation
+from testapp.services import ChatbotService
+
+REPLY = "A canned reply standing in for the completion. " * 5
+
+# Connection settings of the default SQLite configuration
+DEFAULT_PROFILE = {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False, 'OPTIONS': {}}
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the database side of parallel chat turns against SQLite with the "
+        "default settings and with SQLITE_PRODUCTION_PROFILE, and compare "
+        "throughput and 'database is locked' errors. The OpenAI call is left "
+        "out (a canned reply is saved) so that only the database is measured."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16, help="Parallel request threads")
+        parser.add_argument('--turns', type=int, default=50, help="Chat turns per thread")
+        parser.add_argument('--output', help="Write JSON results to this file")
+
+    def handle(self, *args, **options):
+        results = {}
+        for name, profile in (('default', DEFAULT_PROFILE), ('production', settings.SQLITE_PRODUCTION_PROFILE)):
+            results[name] = self.run_profile(profile, options['threads'], options['turns'])
+            summary = results[name]
+            self.stdout.write(
+                f"{name:>10}: {summary['turns_per_s']} turns/s, "
+                f"{summary['locked_errors']} 'database is locked' errors"
+            )
+
+        if options['output']:
+            parameters = {k: options[k] for k in ('threads', 'turns')}
+            write_results(options['output'], 'sqlite_concurrency', results, parameters)
+
+    def run_profile(self, profile, threads, turns):
+        # Every thread's connection is built from this same settings dict
+        saved = {key: connection.settings_dict.get(key) for key in profile}
+        connection.settings_dict.update(profile)
+        try:
+            # A window large enough that no turn needs an upstream summary
+            with benchmark_database(), override_settings(
+                CHATBOT_CONTEXT_MAX_MESSAGES=2 * turns + 2, CHATBOT_CONTEXT_MAX_TOKENS=10 ** 6
+            ):
+                return self.run_turns(threads, turns)
+        finally:
+            connection.settings_dict.update(saved)
+
+    def run_turns(self, threads, turns):
+        users = [User.objects.create_user(username=f'bench{i}', password='bench') for i in range(threads)]
+        chatbot = ChatbotService()
+        errors = {'locked': 0, 'other': 0}
+        lock = threading.Lock()
+
+        def worker(user):
+            conversation_id = None
+            for turn in range(turns):
+                # What the request_started/request_finished signals do around
+                # each request: reuse the connection only if CONN_MAX_AGE allows
+                close_old_connections()
+                try:
+                    # A read of the conversation list, then a chat turn
+                    list(Conversation.objects.filter(user=user).with_summary()[:20])
+                    message_text = f"Message {turn}"
+                    conversation, messages, summary_updated = chatbot._prepare_turn(
+                        user, message_text, conversation_id
+                    )
+                    conversation = chatbot._save_turn(
+                        user, conversation, message_text, REPLY, summary_updated
+                    )
+                    conversation_id = conversation.id
+                except OperationalError as e:
+                    with lock:
+                        errors['locked' if 'locked' in str(e) else 'other'] += 1
+                finally:
+                    close_old_connections()
+            connection.close()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(worker, users))
+        elapsed = time.perf_counter() - start
+
+        completed = threads * turns - errors['locked'] - errors['other']
+        return {
+            "turns": threads * turns,
+            "completed": completed,
+            "locked_errors": errors['locked'],
+            "other_errors": errors['other'],
+            "elapsed_s": round(elapsed, 3),
+            "turns_per_s": round(completed / elapsed, 2),
+        }
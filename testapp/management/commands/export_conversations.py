@@ -0,0 +1,54 @@
+import gzip
+import sys
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from testapp.export import CHUNK_SIZE, export_ndjson
+from testapp.models import Conversation
+
+
+class Command(BaseCommand):
+    help = (
+        "Export conversations and their messages as NDJSON, the format of the "
+        "export endpoint, to a file or stdout. Memory use does not depend on "
+        "the size of the export."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', action='append', dest='users', metavar='USERNAME',
+                            help="Export this user's conversations (repeatable; default: everyone's)")
+        parser.add_argument('--output', help="File to write; .gz files are gzip-compressed (default: stdout)")
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="Rows fetched per query round trip")
+
+    def handle(self, *args, **options):
+        conversations = Conversation.objects.all()
+        if options['users']:
+            users = list(User.objects.filter(username__in=options['users']))
+            missing = set(options['users']) - {user.username for user in users}
+            if missing:
+                raise CommandError(f"Unknown users: {', '.join(sorted(missing))}")
+            conversations = conversations.filter(user__in=users)
+
+        output = options['output']
+        if output is None:
+            out = sys.stdout.buffer
+        elif output.endswith('.gz'):
+            out = gzip.open(output, 'wb')
+        else:
+            out = open(output, 'wb')
+
+        start = time.perf_counter()
+        written = 0
+        try:
+            for chunk in export_ndjson(conversations, options['chunk_size']):
+                out.write(chunk)
+                written += len(chunk)
+        finally:
+            if output is not None:
+                out.close()
+
+        if output is not None:
+            elapsed = time.perf_counter() - start
+            self.stdout.write(f"Wrote {written // 1024} KiB of NDJSON to {output} in {elapsed:.1f}s")
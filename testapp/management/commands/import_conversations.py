@@ -0,0 +1,109 @@
+import gzip
+import json
+import os
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from testapp.importer import BATCH_SIZE, ConversationImporter
+from testapp.models import Conversation
+
+
+class Command(BaseCommand):
+    help = (
+        "Import conversations from an NDJSON file in the format of "
+        "export_conversations (.gz files are decompressed). Rows are inserted "
+        "in batches, one transaction per chunk, and progress is checkpointed "
+        "after each chunk so an interrupted import can be resumed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="NDJSON file to import")
+        parser.add_argument('--user', help="Import every conversation for this user instead of the one in its record")
+        parser.add_argument('--create-users', action='store_true',
+                            help="Create the users named in the records that don't exist")
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="Rows per INSERT")
+        parser.add_argument('--chunk-size', type=int, default=10000,
+                            help="Records per transaction and checkpoint")
+        parser.add_argument('--checkpoint', help="Checkpoint file (default: PATH.checkpoint)")
+        parser.add_argument('--resume', action='store_true', help="Continue from the checkpoint")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        checkpoint_path = options['checkpoint'] or f"{path}.checkpoint"
+
+        user = None
+        if options['user']:
+            user = User.objects.filter(username=options['user']).first()
+            if user is None:
+                raise CommandError(f"Unknown user {options['user']!r}")
+        importer = ConversationImporter(user, options['create_users'], options['batch_size'])
+
+        offset = line_number = 0
+        if options['resume']:
+            offset, line_number = self.load_checkpoint(checkpoint_path, importer)
+            self.stdout.write(f"Resuming at line {line_number + 1}")
+        elif os.path.exists(checkpoint_path):
+            raise CommandError(f"{checkpoint_path} exists: pass --resume, or delete it to start over")
+
+        start = time.perf_counter()
+        resumed_rows = importer.imported_conversations + importer.imported_messages
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                offset += len(line)
+                line_number += 1
+                if not line.strip():
+                    continue
+                try:
+                    importer.add(json.loads(line))
+                except (ValueError, KeyError, TypeError, AttributeError) as e:
+                    raise CommandError(f"Line {line_number}: {e!r}")
+
+                if importer.pending >= options['chunk_size']:
+                    importer.flush()
+                    self.save_checkpoint(checkpoint_path, importer, offset, line_number)
+                    self.report(importer, start, resumed_rows)
+        importer.flush()
+
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        self.report(importer, start, resumed_rows)
+
+    def report(self, importer, start, resumed_rows):
+        rows = importer.imported_conversations + importer.imported_messages - resumed_rows
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f"{importer.imported_conversations} conversations, {importer.imported_messages} messages "
+            f"in {elapsed:.1f}s ({rows / max(elapsed, 1e-9):.0f} rows/s)"
+        )
+
+    def save_checkpoint(self, path, importer, offset, line_number):
+        """Record the position after the last committed chunk"""
+        state = {
+            "offset": offset,
+            "line": line_number,
+            # Its messages may continue in the next chunk
+            "conversation": importer.current and [importer.current[0], importer.current[1].pk],
+            "imported_conversations": importer.imported_conversations,
+            "imported_messages": importer.imported_messages,
+        }
+        with open(f"{path}.tmp", 'w') as f:
+            json.dump(state, f)
+        os.replace(f"{path}.tmp", path)
+
+    def load_checkpoint(self, path, importer):
+        try:
+            with open(path) as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            raise CommandError(f"No checkpoint at {path}")
+
+        if state["conversation"]:
+            source_id, pk = state["conversation"]
+            importer.current = (source_id, Conversation.objects.get(pk=pk))
+        importer.imported_conversations = state["imported_conversations"]
+        importer.imported_messages = state["imported_messages"]
+        return state["offset"], state["line"]
@@ -0,0 +1,32 @@
+import threading
+
+from django.core.management.base import BaseCommand
+
+from testapp.jobs import work
+
+
+class Command(BaseCommand):
+    help = "Run worker threads that process queued chat completions (ChatJob)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=4, help="Number of worker threads")
+
+    def handle(self, *args, **options):
+        stop = threading.Event()
+        threads = [
+            threading.Thread(target=work, args=(stop,), name=f"chat-job-worker-{i}")
+            for i in range(options['threads'])
+        ]
+        for thread in threads:
+            thread.start()
+        self.stdout.write(f"Processing chat jobs with {len(threads)} threads (Ctrl+C to stop)")
+
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(timeout=1)
+        except KeyboardInterrupt:
+            stop.set()
+            self.stdout.write("Stopping after the jobs in progress...")
+            for thread in threads:
+                thread.join()
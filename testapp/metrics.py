@@ -0,0 +1,271 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction
+from django.utils.decorators import sync_and_async_middleware
+
+from rest_framework.renderers import JSONRenderer
+
+from . import completion_cache
+
+# Per-request performance instrumentation.
+# performance_middleware collects the time spent in the database, in upstream
+# (OpenAI) calls and in serialization while a request is handled, reports it
+# in a Server-Timing header and adds it to per-view histograms, which the
+# metrics view exposes in the Prometheus text format. The histograms are
+# per process: scrape every worker, or run a single one.
+
+_current = ContextVar('request_metrics', default=None)
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+class RequestMetrics:
+    """What one request spent its time on"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.upstream_calls = 0
+        self.upstream_time = 0.0
+        self.serialization_time = 0.0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def server_timing(self, total):
+        """The Server-Timing header value, durations in milliseconds"""
+        timings = [
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.db_queries} queries"',
+            f'upstream;dur={self.upstream_time * 1000:.1f};desc="{self.upstream_calls} calls"',
+            f'serialize;dur={self.serialization_time * 1000:.1f}',
+        ]
+        if self.prompt_tokens or self.completion_tokens:
+            timings.append(
+                f'tokens;desc="prompt={self.prompt_tokens} completion={self.completion_tokens}"'
+            )
+        timings.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(timings)
+
+
+class Histogram:
+    """Thread-safe Prometheus histogram with one series per label value"""
+
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label, value):
+        with self._lock:
+            series = self._series.get(label)
+            if series is None:
+                # Per-bucket counts (plus +Inf), sum, count
+                series = self._series[label] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self, label_name):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for label, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                    cumulative += bucket_count
+                    lines.append(f'{self.name}_bucket{{{label_name}="{label}",le="{bound}"}} {cumulative}')
+                lines.append(f'{self.name}_sum{{{label_name}="{label}"}} {total}')
+                lines.append(f'{self.name}_count{{{label_name}="{label}"}} {count}')
+        return lines
+
+
+class Counter:
+    """Thread-safe Prometheus counter with one series per label value"""
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def inc(self, label, value=1):
+        with self._lock:
+            self._series[label] = self._series.get(label, 0) + value
+
+    def render(self, label_name):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for label, value in sorted(self._series.items()):
+                lines.append(f'{self.name}{{{label_name}="{label}"}} {value}')
+        return lines
+
+
+REQUEST_DURATION = Histogram(
+    'chatbot_request_duration_seconds', 'Time to produce the response.', LATENCY_BUCKETS
+)
+DB_QUERIES = Histogram('chatbot_db_queries', 'Database queries per request.', QUERY_BUCKETS)
+DB_DURATION = Histogram(
+    'chatbot_db_duration_seconds', 'Time spent in database queries per request.', LATENCY_BUCKETS
+)
+UPSTREAM_DURATION = Histogram(
+    'chatbot_upstream_duration_seconds', 'Time spent in OpenAI calls per request.', LATENCY_BUCKETS
+)
+SERIALIZATION_DURATION = Histogram(
+    'chatbot_serialization_duration_seconds', 'Time spent rendering JSON per request.', LATENCY_BUCKETS
+)
+PROMPT_TOKENS = Counter('chatbot_prompt_tokens_total', 'Prompt tokens reported by OpenAI.')
+COMPLETION_TOKENS = Counter('chatbot_completion_tokens_total', 'Completion tokens reported by OpenAI.')
+
+# Upstream calls made outside a request: by the chat job workers, or by a
+# response stream after its headers were sent
+BACKGROUND = 'background'
+
+
+def current():
+    """The RequestMetrics of the request being handled, or None"""
+    return _current.get()
+
+
+@contextmanager
+def upstream_call():
+    """Time an upstream call"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        metrics = current()
+        if metrics is None:
+            UPSTREAM_DURATION.observe(BACKGROUND, elapsed)
+        else:
+            metrics.upstream_calls += 1
+            metrics.upstream_time += elapsed
+
+
+def record_usage(usage):
+    """Count the token usage of a completion response (which may not report any)"""
+    if usage is None:
+        return
+    metrics = current()
+    if metrics is None:
+        PROMPT_TOKENS.inc(BACKGROUND, usage.prompt_tokens)
+        COMPLETION_TOKENS.inc(BACKGROUND, usage.completion_tokens)
+    else:
+        metrics.prompt_tokens += usage.prompt_tokens
+        metrics.completion_tokens += usage.completion_tokens
+
+
+@contextmanager
+def serialization():
+    """Time response serialization"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics = current()
+        if metrics is not None:
+            metrics.serialization_time += time.perf_counter() - start
+
+
+class TimedJSONRenderer(JSONRenderer):
+    """JSONRenderer that counts its time as serialization"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with serialization():
+            return super().render(data, accepted_media_type, renderer_context)
+
+
+def _time_query(execute, sql, params, many, context):
+    metrics = current()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.db_queries += 1
+        metrics.db_time += time.perf_counter() - start
+
+
+def install_query_timer(connection):
+    """
+    Time the queries of a new connection (see signals.py).
+
+    This covers the connections of sync_to_async threads too, which a wrapper
+    installed around the view would miss; the request they count towards
+    comes from the context variable, which asgiref copies into those threads.
+    """
+    if _time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_time_query)
+
+
+def _observe(request, response, metrics):
+    total = time.perf_counter() - metrics.started
+    match = request.resolver_match
+    view = (match.url_name if match else None) or 'unmatched'
+
+    REQUEST_DURATION.observe(view, total)
+    DB_QUERIES.observe(view, metrics.db_queries)
+    DB_DURATION.observe(view, metrics.db_time)
+    UPSTREAM_DURATION.observe(view, metrics.upstream_time)
+    SERIALIZATION_DURATION.observe(view, metrics.serialization_time)
+    if metrics.prompt_tokens or metrics.completion_tokens:
+        PROMPT_TOKENS.inc(view, metrics.prompt_tokens)
+        COMPLETION_TOKENS.inc(view, metrics.completion_tokens)
+
+    response['Server-Timing'] = metrics.server_timing(total)
+
+
+@sync_and_async_middleware
+def performance_middleware(get_response):
+    """
+    Measure each request (see the top of this module).
+
+    For streaming responses only the work done before the response starts is
+    counted; what the stream does afterwards can't go in its headers.
+    """
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            metrics = RequestMetrics()
+            token = _current.set(metrics)
+            try:
+                response = await get_response(request)
+            finally:
+                _current.reset(token)
+            _observe(request, response, metrics)
+            return response
+    else:
+        def middleware(request):
+            metrics = RequestMetrics()
+            token = _current.set(metrics)
+            try:
+                response = get_response(request)
+            finally:
+                _current.reset(token)
+            _observe(request, response, metrics)
+            return response
+    return middleware
+
+
+def render_prometheus():
+    """All metrics in the Prometheus text exposition format"""
+    lines = []
+    for histogram in (REQUEST_DURATION, DB_QUERIES, DB_DURATION, UPSTREAM_DURATION, SERIALIZATION_DURATION):
+        lines += histogram.render('view')
+    for counter in (PROMPT_TOKENS, COMPLETION_TOKENS):
+        lines += counter.render('view')
+
+    cache_stats = completion_cache.stats()
+    lines += [
+        '# HELP chatbot_completion_cache_lookups_total Completion cache lookups.',
+        '# TYPE chatbot_completion_cache_lookups_total counter',
+        f'chatbot_completion_cache_lookups_total{{result="hit"}} {cache_stats["hits"]}',
+        f'chatbot_completion_cache_lookups_total{{result="miss"}} {cache_stats["misses"]}',
+    ]
+    return '\n'.join(lines) + '\n'
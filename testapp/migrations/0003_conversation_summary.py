@@ -0,0 +1,23 @@
+# Generated by Django 5.1.6 on 2026-10-18 16:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('testapp', '0002_message_conversation_created_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='summarized_through',
+            field=models.BigIntegerField(blank=True, help_text='ID of the newest message folded into the summary', null=True),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='summary',
+            field=models.TextField(blank=True, default=''),
+        ),
+    ]
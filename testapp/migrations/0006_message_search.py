@@ -0,0 +1,82 @@
+from django.db import migrations
+
+# Full-text index of message content for testapp/search.py (SQLite FTS5).
+# It is an external-content table reading from a view that adds each
+# message's owner as an "owner" column holding a token like "u42", so a
+# search for one user's messages only visits that user's entries. Triggers
+# on testapp_message keep it in sync. Other databases get no index and
+# search.py falls back to a LIKE query.
+
+CREATE_SQL = [
+    """
+    CREATE VIEW testapp_message_search_source AS
+    SELECT m.id AS id, m.content AS content, 'u' || c.user_id AS owner
+    FROM testapp_message m JOIN testapp_conversation c ON c.id = m.conversation_id
+    """,
+    """
+    CREATE VIRTUAL TABLE testapp_message_search USING fts5(
+        content, owner,
+        content='testapp_message_search_source', content_rowid='id',
+        tokenize='porter unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER testapp_message_search_insert AFTER INSERT ON testapp_message BEGIN
+        INSERT INTO testapp_message_search(rowid, content, owner)
+        SELECT new.id, new.content, 'u' || c.user_id
+        FROM testapp_conversation c WHERE c.id = new.conversation_id;
+    END
+    """,
+    """
+    CREATE TRIGGER testapp_message_search_delete AFTER DELETE ON testapp_message BEGIN
+        INSERT INTO testapp_message_search(testapp_message_search, rowid, content, owner)
+        SELECT 'delete', old.id, old.content, 'u' || c.user_id
+        FROM testapp_conversation c WHERE c.id = old.conversation_id;
+    END
+    """,
+    """
+    CREATE TRIGGER testapp_message_search_update AFTER UPDATE OF content, conversation_id ON testapp_message BEGIN
+        INSERT INTO testapp_message_search(testapp_message_search, rowid, content, owner)
+        SELECT 'delete', old.id, old.content, 'u' || c.user_id
+        FROM testapp_conversation c WHERE c.id = old.conversation_id;
+        INSERT INTO testapp_message_search(rowid, content, owner)
+        SELECT new.id, new.content, 'u' || c.user_id
+        FROM testapp_conversation c WHERE c.id = new.conversation_id;
+    END
+    """,
+    # Index the existing messages
+    "INSERT INTO testapp_message_search(testapp_message_search) VALUES ('rebuild')",
+]
+
+DROP_SQL = [
+    "DROP TRIGGER IF EXISTS testapp_message_search_update",
+    "DROP TRIGGER IF EXISTS testapp_message_search_delete",
+    "DROP TRIGGER IF EXISTS testapp_message_search_insert",
+    "DROP TABLE IF EXISTS testapp_message_search",
+    "DROP VIEW IF EXISTS testapp_message_search_source",
+]
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in CREATE_SQL:
+        schema_editor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in DROP_SQL:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('testapp', '0005_message_usage_dailyusage'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.1.6 on 2026-10-18 17:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('testapp', '0006_message_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConversationArchive',
+            fields=[
+                ('conversation', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='archive', serialize=False, to='testapp.conversation')),
+                ('data', models.BinaryField(help_text='gzip-compressed JSON of the messages')),
+                ('message_count', models.PositiveIntegerField()),
+                ('last_message_preview', models.CharField(blank=True, default='', max_length=100)),
+                ('last_message_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
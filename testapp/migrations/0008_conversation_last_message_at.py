@@ -0,0 +1,42 @@
+# Generated by Django 5.1.6 on 2026-10-18 17:23
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+# The full-text search view and triggers refer to testapp_conversation
+from testapp import search_schema
+
+
+def backfill_last_message_at(apps, schema_editor):
+    """The newest message's time, the archive's for archived conversations, else the creation time"""
+    Conversation = apps.get_model('testapp', 'Conversation')
+    ConversationArchive = apps.get_model('testapp', 'ConversationArchive')
+    Message = apps.get_model('testapp', 'Message')
+
+    latest_message = Message.objects.filter(conversation=OuterRef('pk')).order_by('-created_at')
+    archive = ConversationArchive.objects.filter(conversation=OuterRef('pk'))
+    Conversation.objects.update(last_message_at=Coalesce(
+        Subquery(latest_message.values('created_at')[:1]),
+        Subquery(archive.values('last_message_at')[:1]),
+        'created_at',
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('testapp', '0007_conversationarchive'),
+    ]
+
+    operations = [
+        migrations.RunPython(search_schema.drop_search_sources, search_schema.create_search_sources),
+        migrations.AddField(
+            model_name='conversation',
+            name='last_message_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(search_schema.create_search_sources, search_schema.drop_search_sources),
+        migrations.RunPython(backfill_last_message_at, migrations.RunPython.noop),
+    ]
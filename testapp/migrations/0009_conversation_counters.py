@@ -0,0 +1,57 @@
+# Generated by Django 5.1.6 on 2026-10-18 17:26
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Substr
+
+# The full-text search view and triggers refer to testapp_conversation
+from testapp import search_schema
+
+
+def backfill_counters(apps, schema_editor):
+    """Count the messages (archived ones included) and copy the preview of the newest"""
+    Conversation = apps.get_model('testapp', 'Conversation')
+    ConversationArchive = apps.get_model('testapp', 'ConversationArchive')
+    Message = apps.get_model('testapp', 'Message')
+
+    messages = Message.objects.filter(conversation=OuterRef('pk'))
+    archive = ConversationArchive.objects.filter(conversation=OuterRef('pk'))
+    message_count = messages.order_by().values('conversation').annotate(count=Count('id')).values('count')
+    latest_message = messages.order_by('-created_at', '-id').annotate(preview=Substr('content', 1, 100))
+    Conversation.objects.update(
+        message_count=Coalesce(Subquery(message_count), Subquery(archive.values('message_count')[:1]), 0),
+        last_message_preview=Coalesce(
+            Subquery(latest_message.values('preview')[:1]),
+            Subquery(archive.values('last_message_preview')[:1]),
+            Value(''),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('testapp', '0008_conversation_last_message_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(search_schema.drop_search_sources, search_schema.create_search_sources),
+        migrations.AddField(
+            model_name='conversation',
+            name='last_message_preview',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='message_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='conversation',
+            index=models.Index(fields=['user', 'last_message_at'], name='conversation_user_active_idx'),
+        ),
+        migrations.RunPython(search_schema.create_search_sources, search_schema.drop_search_sources),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
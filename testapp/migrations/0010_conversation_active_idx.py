@@ -0,0 +1,19 @@
+# Generated by Django 5.1.6 on 2026-10-18 17:44
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('testapp', '0009_conversation_counters'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='conversation',
+            index=models.Index(fields=['last_message_at'], name='conversation_active_idx'),
+        ),
+    ]
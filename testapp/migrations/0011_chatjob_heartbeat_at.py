@@ -0,0 +1,26 @@
+# Generated by Django 5.1.6 on 2026-10-18 17:59
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_heartbeat_at(apps, schema_editor):
+    """Jobs running during the upgrade go stale as they did before"""
+    ChatJob = apps.get_model('testapp', 'ChatJob')
+    ChatJob.objects.filter(status='running').update(heartbeat_at=F('started_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('testapp', '0010_conversation_active_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatjob',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_heartbeat_at, migrations.RunPython.noop),
+    ]
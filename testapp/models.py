@@ -1,10 +1,62 @@
 # Add these models to your existing models.py file
-from django.db import models
+from django.db import IntegrityError, models, transaction
 from django.contrib.auth.models import User
+from django.db.models import Count, F, Max, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest, Substr
+from django.utils import timezone
+
+class ConversationQuerySet(models.QuerySet):
+    def with_summary(self):
+        """Load only the columns of a conversation summary"""
+        return self.only('id', 'created_at', 'last_message_at', 'message_count', 'last_message_preview')
+
+    def with_computed_summary(self):
+        """
+        Annotate what message_count, last_message_at and last_message_preview
+        should be, from the messages and the archive, as computed_* (for
+        reconcile_conversations)
+        """
+        last_message = Message.objects.filter(conversation=OuterRef('pk')).order_by('-created_at', '-id')
+        return self.annotate(
+            computed_message_count=Count('messages') + Coalesce('archive__message_count', 0),
+            # Without messages there is nothing to derive it from
+            computed_last_message_at=Coalesce(
+                Max('messages__created_at'), 'archive__last_message_at', 'last_message_at'
+            ),
+            computed_last_message_preview=Coalesce(
+                Subquery(last_message.annotate(preview=Substr('content', 1, 100)).values('preview')[:1]),
+                'archive__last_message_preview',
+                Value(''),
+            ),
+        )
 
 class Conversation(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Rolling summary of the turns that no longer fit in the prompt window
+    summary = models.TextField(blank=True, default='')
+    summarized_through = models.BigIntegerField(
+        null=True, blank=True,
+        help_text="ID of the newest message folded into the summary"
+    )
+    # Denormalized from the messages (archived ones included) and kept up to
+    # date by ChatbotService, so conversation lists don't aggregate the
+    # Message table; `manage.py reconcile_conversations` repairs any drift.
+    # last_message_at (creation time until there is a message) is also the
+    # version of the conversation for conditional GETs.
+    last_message_at = models.DateTimeField(default=timezone.now)
+    message_count = models.PositiveIntegerField(default=0)
+    last_message_preview = models.CharField(max_length=100, blank=True, default='')
+
+    objects = ConversationQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Conversation lists, most recently active first
+            models.Index(fields=['user', 'last_message_at'], name='conversation_user_active_idx'),
+            # Idle conversations, for archive_conversations
+            models.Index(fields=['last_message_at'], name='conversation_active_idx'),
+        ]
     
     def __str__(self):
         return f"Conversation {self.id} - {self.user.username}"
@@ -14,6 +66,123 @@ class Message(models.Model):
     content = models.TextField()
     is_user = models.BooleanField(default=True)  # True if message is from user, False if from bot
     created_at = models.DateTimeField(auto_now_add=True)
+    # Completion details, set on bot messages that came from OpenAI
+    model = models.CharField(max_length=100, blank=True, default='')
+    prompt_tokens = models.PositiveIntegerField(null=True, blank=True)
+    completion_tokens = models.PositiveIntegerField(null=True, blank=True)
+    latency_ms = models.PositiveIntegerField(null=True, blank=True, help_text="Upstream call duration")
+    finish_reason = models.CharField(max_length=20, blank=True, default='')
+
+    class Meta:
+        indexes = [
+            # Paging through a conversation's history is a range scan on this
+            models.Index(fields=['conversation', 'created_at'], name='message_conv_created_idx'),
+        ]
     
     def __str__(self):
-        return f"{'User' if self.is_user else 'Bot'}: {self.content[:50]}..."
\ No newline at end of file
+        return f"{'User' if self.is_user else 'Bot'}: {self.content[:50]}..."
+class ConversationArchive(models.Model):
+    """The messages of an idle conversation, moved out of the Message table (see archive.py)"""
+    conversation = models.OneToOneField(
+        Conversation, primary_key=True, related_name='archive', on_delete=models.CASCADE
+    )
+    data = models.BinaryField(help_text="gzip-compressed JSON of the messages")
+    message_count = models.PositiveIntegerField()
+    last_message_preview = models.CharField(max_length=100, blank=True, default='')
+    last_message_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Archive of conversation {self.conversation_id} ({self.message_count} messages)"
+
+class ChatJob(models.Model):
+    """A chat completion queued for a background worker (see jobs.py)"""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    # The conversation to continue, or the one the worker created
+    conversation = models.ForeignKey(Conversation, null=True, blank=True, on_delete=models.SET_NULL)
+    message = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    result = models.TextField(blank=True, default='')
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # Refreshed by the worker running the job; see jobs.claim_next()
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Workers claim the oldest pending job
+            models.Index(fields=['status', 'created_at'], name='chatjob_status_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"ChatJob {self.id} ({self.status})"
+
+class DailyUsageManager(models.Manager):
+    def record(self, user, day, prompt_tokens, completion_tokens, latency_ms, completions=1, max_latency_ms=None):
+        """
+        Add completions to the user's row for the day: one by default, or
+        ``completions`` whose usage and latency are summed in the arguments
+        (with the slowest one's latency as ``max_latency_ms``).
+
+        Counters are incremented in the database with F() expressions, so
+        concurrent turns don't lose updates. Call it inside the transaction
+        that saves the message.
+        """
+        if max_latency_ms is None:
+            max_latency_ms = latency_ms
+        increments = {
+            'completions': F('completions') + completions,
+            'prompt_tokens': F('prompt_tokens') + (prompt_tokens or 0),
+            'completion_tokens': F('completion_tokens') + (completion_tokens or 0),
+            'total_latency_ms': F('total_latency_ms') + latency_ms,
+            'max_latency_ms': Greatest(F('max_latency_ms'), max_latency_ms),
+        }
+        if self.filter(user=user, day=day).update(**increments):
+            return
+        try:
+            with transaction.atomic():
+                self.create(
+                    user=user,
+                    day=day,
+                    completions=completions,
+                    prompt_tokens=prompt_tokens or 0,
+                    completion_tokens=completion_tokens or 0,
+                    total_latency_ms=latency_ms,
+                    max_latency_ms=max_latency_ms,
+                )
+        except IntegrityError:
+            # Another turn created the row first
+            self.filter(user=user, day=day).update(**increments)
+
+class DailyUsage(models.Model):
+    """Per-user, per-day rollup of completion usage, kept up to date by ChatbotService"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    day = models.DateField()
+    completions = models.PositiveIntegerField(default=0)
+    prompt_tokens = models.BigIntegerField(default=0)
+    completion_tokens = models.BigIntegerField(default=0)
+    total_latency_ms = models.BigIntegerField(default=0)
+    max_latency_ms = models.PositiveIntegerField(default=0)
+
+    objects = DailyUsageManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'day'], name='dailyusage_user_day_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} {self.day}: {self.completions} completions"
@@ -0,0 +1,149 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Local stand-in for the OpenAI chat completions API, used by the benchmarks.
+# Point OPENAI_BASE_URL at StubOpenAIServer.base_url to use it.
+
+DEFAULT_REPLY = "This is a canned reply from the local OpenAI stub."
+
+
+class _StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024  # Hold bursts of concurrent connections
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep-alive, like the real API
+    disable_nagle_algorithm = True  # Don't add delayed-ACK stalls to small responses
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        if not self.path.endswith('/chat/completions'):
+            self.send_error(404)
+            return
+
+        length = int(self.headers.get('Content-Length', 0))
+        request = json.loads(self.rfile.read(length) or b'{}')
+        stub = self.server.stub
+        stub.count_request()
+
+        prompt_tokens = sum(len(m.get('content') or '') for m in request.get('messages', [])) // 4
+        completion_tokens = len(stub.reply) // 4
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        base = {
+            "id": "chatcmpl-stub",
+            "created": int(time.time()),
+            "model": request.get('model', 'stub'),
+        }
+
+        if request.get('stream'):
+            include_usage = (request.get('stream_options') or {}).get('include_usage')
+            self._stream(stub, base, usage if include_usage else None)
+            return
+
+        time.sleep(stub.latency)
+        body = json.dumps({
+            **base,
+            "object": "chat.completion",
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": stub.reply},
+                "finish_reason": "stop",
+            }],
+            "usage": usage,
+        }).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream(self, stub, base, usage=None):
+        words = stub.reply.split(' ')
+        # Spread the latency over the chunks, as a real stream would
+        delay = stub.latency / max(len(words), 1)
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        try:
+            self._write_stream(words, delay, base, usage)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True  # The caller stopped reading
+
+    def _write_stream(self, words, delay, base, usage):
+        for i, word in enumerate(words):
+            time.sleep(delay)
+            content = word if i == 0 else ' ' + word
+            self._write_event({
+                **base,
+                "object": "chat.completion.chunk",
+                "choices": [{"index": 0, "delta": {"content": content}, "finish_reason": None}],
+            })
+        self._write_event({
+            **base,
+            "object": "chat.completion.chunk",
+            "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+        })
+        if usage is not None:
+            # Sent when the request asks for it with stream_options
+            self._write_event({**base, "object": "chat.completion.chunk", "choices": [], "usage": usage})
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._write_chunk(b"")
+
+    def _write_event(self, data):
+        self._write_chunk(f"data: {json.dumps(data)}\n\n".encode())
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+
+class StubOpenAIServer:
+    """
+    Serve canned chat completions on a local port from a background thread.
+
+    ``latency`` is the time in seconds each completion takes (spread across
+    the chunks of a streamed response).
+    """
+
+    def __init__(self, latency=0.2, reply=DEFAULT_REPLY):
+        self.latency = latency
+        self.reply = reply
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def count_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def start(self):
+        self._server = _StubServer(('127.0.0.1', 0), _Handler)
+        self._server.stub = self
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
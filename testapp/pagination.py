@@ -0,0 +1,105 @@
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def get_page_size(params, default=DEFAULT_PAGE_SIZE):
+    """Read the ``limit`` query parameter, clamped to MAX_PAGE_SIZE"""
+    try:
+        limit = int(params.get('limit', default))
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def encode_cursor(timestamp, pk):
+    """Build an opaque keyset cursor from a (timestamp, id) position"""
+    raw = f"{timestamp.isoformat()}|{pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Return the (timestamp, id) position of a cursor, or None if it is invalid"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        timestamp, pk = raw.split('|')
+        return datetime.fromisoformat(timestamp), int(pk)
+    except (ValueError, UnicodeError):
+        return None
+
+
+def keyset_page(queryset, field, cursor, page_size):
+    """
+    Return the rows of one page of ``queryset`` ordered newest first by
+    ``field`` (ties broken by id), plus one extra row to detect a next page.
+
+    Rows after the cursor are selected with a range condition rather than
+    an OFFSET, so every page costs the same however deep the client goes.
+    """
+    queryset = queryset.order_by(f'-{field}', '-id')
+    if cursor:
+        timestamp, pk = cursor
+        queryset = queryset.filter(
+            Q(**{f'{field}__lt': timestamp}) | Q(**{field: timestamp, 'id__lt': pk})
+        )
+    return queryset[:page_size + 1]
+
+
+def keyset_result(rows, field, page_size):
+    """Split rows fetched by keyset_page() into the page and the next cursor"""
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, field), last.id)
+    return rows, next_cursor
+
+
+def keyset_paginate(queryset, field, cursor, page_size):
+    """Return one page of ``queryset`` and the cursor of the next page, or None"""
+    return keyset_result(list(keyset_page(queryset, field, cursor, page_size)), field, page_size)
+
+
+def parse_message_cursors(params):
+    """Return the (before, after) message ids; raises ValueError if not integers"""
+    before = int(params['before']) if 'before' in params else None
+    after = int(params['after']) if 'after' in params else None
+    return before, after
+
+
+def message_page(messages, before, after, page_size):
+    """
+    Return the rows of one page of messages plus one extra row, and whether
+    they are ordered newest first.
+
+    Without a cursor, or with ``before``, this is the most recent page before
+    that point (for loading history backwards); with ``after`` it is the page
+    following that message.
+    """
+    if after is not None:
+        return messages.filter(id__gt=after).order_by('created_at', 'id')[:page_size + 1], False
+    if before is not None:
+        messages = messages.filter(id__lt=before)
+    return messages.order_by('-created_at', '-id')[:page_size + 1], True
+
+
+def message_page_in_memory(messages, before, after, page_size):
+    """message_page() over a list of messages ordered oldest first, e.g. archived ones"""
+    if after is not None:
+        return [m for m in messages if m.id > after][:page_size + 1], False
+    if before is not None:
+        messages = [m for m in messages if m.id < before]
+    return messages[::-1][:page_size + 1], True
+
+
+def message_result(rows, page_size, newest_first):
+    """Return the page of messages, oldest first, and whether there are more"""
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if newest_first:
+        rows = rows[::-1]
+    return rows, has_more
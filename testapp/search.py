@@ -0,0 +1,84 @@
+import re
+
+from django.db import connection
+from django.db.models import FloatField, Value
+from django.db.models.functions import Substr
+from django.utils.html import escape
+
+from .models import Message
+
+# Full-text search of a user's messages, over the FTS5 index created by
+# migration 0006 (SQLite only; other databases fall back to a LIKE scan).
+
+SEARCH_TABLE = 'testapp_message_search'
+SNIPPET_TOKENS = 16
+
+# Private-use characters mark the matches in snippets, so the message text
+# can be HTML-escaped before they become <mark> tags
+_MARK_START = '\ue000'
+_MARK_END = '\ue001'
+
+_SEARCH_SQL = f"""
+    SELECT m.id, m.conversation_id, m.is_user, m.created_at,
+           snippet({SEARCH_TABLE}, 0, %s, %s, '…', {SNIPPET_TOKENS}) AS snippet,
+           bm25({SEARCH_TABLE}, 1.0, 0.0) AS score
+    FROM {SEARCH_TABLE}
+    JOIN testapp_message m ON m.id = {SEARCH_TABLE}.rowid
+    WHERE {SEARCH_TABLE} MATCH %s
+    ORDER BY score, m.id DESC
+    LIMIT %s OFFSET %s
+"""
+
+
+def build_match_query(user, text):
+    """
+    Turn user input into an FTS5 query: every word must match, the last one
+    as a prefix (search as you type), within the user's messages. Returns
+    None if the input has no words.
+    """
+    words = re.findall(r'\w+', text)
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    # The words are scoped to content: unscoped, "u42" would match the owner column
+    return f'owner:"u{user.pk}" AND content:(' + ' AND '.join(terms) + ')'
+
+
+def highlight(snippet):
+    """HTML-escape a snippet and wrap its matches in <mark> tags"""
+    return escape(snippet).replace(_MARK_START, '<mark>').replace(_MARK_END, '</mark>')
+
+
+def search_messages(user, text, limit, offset=0):
+    """
+    Return (messages, has_more) for one page of the user's messages matching
+    ``text``, best match first. Each message has ``snippet`` and ``score``
+    (lower is better) attributes; its content is not loaded.
+    """
+    if connection.vendor != 'sqlite':
+        return _search_messages_like(user, text, limit, offset)
+
+    match = build_match_query(user, text)
+    if match is None:
+        return [], False
+
+    rows = list(Message.objects.raw(
+        _SEARCH_SQL, [_MARK_START, _MARK_END, match, limit + 1, offset]
+    ))
+    for row in rows:
+        row.snippet = highlight(row.snippet)
+    return rows[:limit], len(rows) > limit
+
+
+def _search_messages_like(user, text, limit, offset):
+    """Unranked fallback without the FTS5 index, newest first"""
+    rows = list(
+        Message.objects.filter(conversation__user=user, content__icontains=text)
+        .annotate(snippet=Substr('content', 1, 200), score=Value(0.0, output_field=FloatField()))
+        .only('id', 'conversation_id', 'is_user', 'created_at')
+        .order_by('-created_at', '-id')[offset:offset + limit + 1]
+    )
+    for row in rows:
+        row.snippet = escape(row.snippet)
+    return rows[:limit], len(rows) > limit
@@ -0,0 +1,65 @@
+# The sources of the full-text search index created by migration 0006
+# (SQLite only): the view the FTS5 table reads message content and owners
+# from, and the triggers on testapp_message that keep the index in sync.
+#
+# SQLite rebuilds a table to alter it, which fails while the view or the
+# triggers refer to it. Migrations that alter testapp_conversation or
+# testapp_message run drop_search_sources() before and create_search_sources()
+# after; the index itself is kept, and messages can't change in between.
+# Migrations depend on this module, so change the SQL only together with a
+# migration that recreates the sources.
+
+SOURCE_VIEW_SQL = """
+    CREATE VIEW testapp_message_search_source AS
+    SELECT m.id AS id, m.content AS content, 'u' || c.user_id AS owner
+    FROM testapp_message m JOIN testapp_conversation c ON c.id = m.conversation_id
+"""
+
+TRIGGERS_SQL = [
+    """
+    CREATE TRIGGER testapp_message_search_insert AFTER INSERT ON testapp_message BEGIN
+        INSERT INTO testapp_message_search(rowid, content, owner)
+        SELECT new.id, new.content, 'u' || c.user_id
+        FROM testapp_conversation c WHERE c.id = new.conversation_id;
+    END
+    """,
+    """
+    CREATE TRIGGER testapp_message_search_delete AFTER DELETE ON testapp_message BEGIN
+        INSERT INTO testapp_message_search(testapp_message_search, rowid, content, owner)
+        SELECT 'delete', old.id, old.content, 'u' || c.user_id
+        FROM testapp_conversation c WHERE c.id = old.conversation_id;
+    END
+    """,
+    """
+    CREATE TRIGGER testapp_message_search_update AFTER UPDATE OF content, conversation_id ON testapp_message BEGIN
+        INSERT INTO testapp_message_search(testapp_message_search, rowid, content, owner)
+        SELECT 'delete', old.id, old.content, 'u' || c.user_id
+        FROM testapp_conversation c WHERE c.id = old.conversation_id;
+        INSERT INTO testapp_message_search(rowid, content, owner)
+        SELECT new.id, new.content, 'u' || c.user_id
+        FROM testapp_conversation c WHERE c.id = new.conversation_id;
+    END
+    """,
+]
+
+DROP_TRIGGERS_SQL = [
+    "DROP TRIGGER IF EXISTS testapp_message_search_update",
+    "DROP TRIGGER IF EXISTS testapp_message_search_delete",
+    "DROP TRIGGER IF EXISTS testapp_message_search_insert",
+]
+
+DROP_VIEW_SQL = "DROP VIEW IF EXISTS testapp_message_search_source"
+
+
+def drop_search_sources(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in [*DROP_TRIGGERS_SQL, DROP_VIEW_SQL]:
+        schema_editor.execute(sql)
+
+
+def create_search_sources(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in [SOURCE_VIEW_SQL, *TRIGGERS_SQL]:
+        schema_editor.execute(sql)
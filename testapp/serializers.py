@@ -1,8 +1,22 @@
 from rest_framework import serializers
+from django.conf import settings
 from django.contrib.auth.models import User
-from django.contrib.auth import authenticate
-from .models import Conversation, Message
-import re
+from django.contrib.auth import authenticate, password_validation
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from drf_yasg.utils import swagger_serializer_method
+from . import archive
+from .models import ChatJob, Conversation, Message
+
+def check_password_policy(field, password, user=None):
+    """Run AUTH_PASSWORD_VALIDATORS (see validators.py), reporting every violation on field"""
+    try:
+        password_validation.validate_password(password, user)
+    except DjangoValidationError as e:
+        raise serializers.ValidationError({field: list(e.messages)})
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -17,61 +31,54 @@ class RegisterSerializer(serializers.ModelSerializer):
         fields = ('username', 'email', 'password', 'password2')
         extra_kwargs = {
             'password': {'write_only': True, 'style': {'input_type': 'password'}},
+            # Uniqueness is checked in create(), together with the email's
+            'username': {'validators': [UnicodeUsernameValidator()]},
         }
     
-    def validate_password(self, value):
-        """
-        Validate password meets security requirements:
-        - At least 8 characters long
-        - Contains uppercase letter
-        - Contains a number
-        - Contains a special character
-        """
-        if len(value) < 8:
-            raise serializers.ValidationError("Password must be at least 8 characters long.")
-        
-        if not re.search(r'[A-Z]', value):
-            raise serializers.ValidationError("Password must contain at least one uppercase letter.")
-            
-        if not re.search(r'[0-9]', value):
-            raise serializers.ValidationError("Password must contain at least one number.")
-            
-        if not re.search(r'[!@#$%^&*(),.?":{}|<>]', value):
-            raise serializers.ValidationError("Password must contain at least one special character.")
-            
-        return value
-    
     def validate(self, data):
         # Check that passwords match
         if data['password'] != data['password2']:
             raise serializers.ValidationError({"password2": "Passwords don't match"})
+
+        # Password policy, including similarity to the username and email
+        user = User(username=data['username'], email=data.get('email', ''))
+        check_password_policy('password', data['password'], user)
         return data
     
     def create(self, validated_data):
-        # Remove password2 as it's not needed for user creation
-        validated_data.pop('password2', None)
-        
-        # Check if username already exists
-        if User.objects.filter(username=validated_data['username']).exists():
+        username = User.normalize_username(validated_data['username'])
+        email = User.objects.normalize_email(validated_data.get('email', ''))
+
+        # Check username and email in one query
+        taken = Q(username=username)
+        if email:
+            taken |= Q(email=email)
+        errors = {}
+        for taken_username, taken_email in User.objects.filter(taken).values_list('username', 'email'):
+            if taken_username == username:
+                errors['username'] = 'This username is already taken'
+            if email and taken_email == email:
+                errors['email'] = 'This email is already registered'
+        if errors:
+            raise serializers.ValidationError(errors)
+
+        # The async view hashes on its own pool and passes save(password_hash=...)
+        password = validated_data.get('password_hash') or make_password(validated_data['password'])
+
+        try:
+            with transaction.atomic():
+                user = User.objects.create(username=username, email=email, password=password)
+        except IntegrityError:
+            # The username was registered since the check
             raise serializers.ValidationError({'username': 'This username is already taken'})
-            
-        # Check if email already exists
-        if User.objects.filter(email=validated_data['email']).exists():
-            raise serializers.ValidationError({'email': 'This email is already registered'})
-        
-        # Create user with validated data
-        user = User.objects.create_user(
-            username=validated_data['username'],
-            email=validated_data['email'],
-            password=validated_data['password']
-        )
-        
+
         return user
 
-class LoginSerializer(serializers.Serializer):
+class LoginCredentialsSerializer(serializers.Serializer):
     username = serializers.CharField()
     password = serializers.CharField(style={'input_type': 'password'}, trim_whitespace=False)
-    
+
+class LoginSerializer(LoginCredentialsSerializer):
     def validate(self, data):
         username = data.get('username')
         password = data.get('password')
@@ -129,27 +136,7 @@ class ProfileUpdateSerializer(serializers.ModelSerializer):
                 )
                 
             # Validate new password strength
-            if 'new_password' in data:
-                password = data['new_password']
-                if len(password) < 8:
-                    raise serializers.ValidationError(
-                        {"new_password": "Password must be at least 8 characters long."}
-                    )
-                
-                if not re.search(r'[A-Z]', password):
-                    raise serializers.ValidationError(
-                        {"new_password": "Password must contain at least one uppercase letter."}
-                    )
-                    
-                if not re.search(r'[0-9]', password):
-                    raise serializers.ValidationError(
-                        {"new_password": "Password must contain at least one number."}
-                    )
-                    
-                if not re.search(r'[!@#$%^&*(),.?":{}|<>]', password):
-                    raise serializers.ValidationError(
-                        {"new_password": "Password must contain at least one special character."}
-                    )
+            check_password_policy('new_password', data['new_password'], self.context['request'].user)
         
         return data
     
@@ -176,16 +163,65 @@ class MessageSerializer(serializers.ModelSerializer):
         fields = ['id', 'content', 'is_user', 'created_at']
 
 class ConversationSerializer(serializers.ModelSerializer):
-    messages = MessageSerializer(many=True, read_only=True)
+    messages = serializers.SerializerMethodField()
     
     class Meta:
         model = Conversation
         fields = ['id', 'created_at', 'messages']
 
+    @swagger_serializer_method(serializer_or_field=MessageSerializer(many=True))
+    def get_messages(self, conversation):
+        # Archived conversations are served from the archive (select_related
+        # 'archive' to avoid a query per conversation)
+        messages = archive.archived_messages(conversation)
+        if messages is None:
+            messages = conversation.messages.all()
+        return MessageSerializer(messages, many=True).data
+
+class ConversationSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Conversation
+        fields = ['id', 'created_at', 'last_message_at', 'message_count', 'last_message_preview']
+
+class SearchResultSerializer(serializers.ModelSerializer):
+    """A message matching a search, from search.search_messages"""
+    message_id = serializers.IntegerField(source='id', read_only=True)
+    conversation_id = serializers.IntegerField(read_only=True)
+    # HTML-escaped excerpt with the matches in <mark> tags
+    snippet = serializers.CharField(read_only=True)
+    score = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = Message
+        fields = ['message_id', 'conversation_id', 'is_user', 'created_at', 'snippet', 'score']
+
 class ChatMessageSerializer(serializers.Serializer):
     message = serializers.CharField(required=True)
     conversation_id = serializers.IntegerField(required=False)
 
+class ChatBatchSerializer(serializers.Serializer):
+    # Each item is validated on its own with ChatMessageSerializer, so one
+    # invalid item doesn't fail the batch
+    messages = serializers.ListField(
+        child=serializers.JSONField(), allow_empty=False,
+        help_text="Items like the body of a chat message request"
+    )
+
+    def validate_messages(self, value):
+        if len(value) > settings.CHATBOT_BATCH_MAX_ITEMS:
+            raise serializers.ValidationError(
+                f"At most {settings.CHATBOT_BATCH_MAX_ITEMS} messages can be sent at once"
+            )
+        return value
+
+class ChatJobSerializer(serializers.ModelSerializer):
+    job_id = serializers.IntegerField(source='id', read_only=True)
+    message = serializers.CharField(source='result', read_only=True)
+
+    class Meta:
+        model = ChatJob
+        fields = ['job_id', 'status', 'conversation_id', 'message', 'error', 'created_at', 'finished_at']
+
 class NewConversationSerializer(serializers.Serializer):
     # Empty serializer since we just need to create a new conversation
     # without any initial data
@@ -1,80 +1,463 @@
-import os
-import openai
+import asyncio
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from asgiref.sync import sync_to_async
 from django.conf import settings
-from .models import Conversation, Message
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from . import archive, completion_cache, metrics
+from .clients import (
+    async_upstream_slot, get_async_openai_client, get_openai_client, has_long_lived_loop, upstream_slot
+)
+from .context import ConversationContextManager
+from .models import Conversation, DailyUsage, Message
+
+SYSTEM_PROMPT = "You are a helpful assistant."
+CHAT_MODEL = "gpt-4o-mini"  # or any other model you prefer
+COMPLETION_PARAMS = {"max_tokens": 500, "temperature": 0.7}
+
+
+def completion_details(model, usage, finish_reason, started):
+    """Message fields describing an upstream completion that started at ``started``"""
+    return {
+        "model": model or '',
+        "prompt_tokens": usage.prompt_tokens if usage else None,
+        "completion_tokens": usage.completion_tokens if usage else None,
+        "finish_reason": finish_reason or '',
+        "latency_ms": round((time.perf_counter() - started) * 1000),
+    }
+
+def conversation_changes(messages):
+    """
+    The update() of a conversation's denormalized fields for new messages
+    (saved, oldest first); the count is incremented in the database, so
+    concurrent turns don't lose updates
+    """
+    return {
+        "message_count": F("message_count") + len(messages),
+        "last_message_at": messages[-1].created_at,
+        "last_message_preview": messages[-1].content[:100],
+    }
 
 class ChatbotService:
-    def __init__(self):
-        self.api_key = settings.OPENAI_API_KEY
-        openai.api_key = self.api_key
-        
+    # Cheap to construct: the OpenAI clients and their connection pools are
+    # shared by the whole process (see clients.py)
+
+    def summarize(self, user, previous_summary, messages):
+        """Fold messages into the previous conversation summary, adding the call to the user's DailyUsage"""
+        transcript = "\n".join(
+            f"{'User' if msg.is_user else 'Assistant'}: {msg.content}" for msg in messages
+        )
+        prompt = (
+            "Update the summary of a conversation with the new turns below. "
+            "Keep facts, names and decisions; be concise.\n\n"
+            f"Current summary:\n{previous_summary or '(none)'}\n\n"
+            f"New turns:\n{transcript}"
+        )
+        with upstream_slot(), metrics.upstream_call():
+            started = time.perf_counter()
+            response = get_openai_client().chat.completions.create(
+                model=CHAT_MODEL,
+                messages=[{"role": "user", "content": prompt}],
+                max_tokens=settings.CHATBOT_SUMMARY_MAX_TOKENS,
+                temperature=0,
+            )
+        metrics.record_usage(response.usage)
+        choice = response.choices[0]
+        details = completion_details(response.model, response.usage, choice.finish_reason, started)
+        DailyUsage.objects.record(
+            user,
+            timezone.localdate(),
+            details["prompt_tokens"],
+            details["completion_tokens"],
+            details["latency_ms"],
+        )
+        return choice.message.content.strip()
+
+    def _prepare_turn(self, user, message_text, conversation_id=None):
+        """
+        Find the conversation and build the message list to send to OpenAI.
+
+        Nothing is saved here: the conversation (if new), the user message
+        and the bot reply are written together by _save_turn once the reply
+        is known, so no transaction is held open during the upstream call.
+        Returns (conversation or None if a new one is needed, messages,
+        whether the conversation summary changed).
+        """
+        conversation = None
+        if conversation_id:
+            conversation = (
+                Conversation.objects.filter(id=conversation_id, user=user)
+                .select_related('archive').defer('archive__data')
+                .first()
+            )
+
+        messages, summary_updated = self._build_messages(user, conversation, message_text)
+        return conversation, messages, summary_updated
+
+    def _build_messages(self, user, conversation, message_text):
+        """
+        Return the message list for the next turn of ``conversation`` (None
+        for a new one) and whether the conversation summary changed.
+        """
+        if conversation is None:
+            messages = [
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": message_text},
+            ]
+            return messages, False
+
+        if archive.get_archive(conversation) is not None:
+            # Continuing an archived conversation brings its messages back
+            archive.restore_conversation(conversation)
+
+        context = ConversationContextManager(partial(self.summarize, user), SYSTEM_PROMPT)
+        messages = context.build_messages(conversation, message_text)
+        return messages, context.summary_updated
+
+    def _prepare_batch(self, user, items):
+        """
+        _prepare_turn for a batch of ``{"message", "conversation_id"}``
+        items, fetching their conversations in one query. Returns a
+        (conversation, messages, summary_updated) tuple per item.
+        """
+        ids = {item.get('conversation_id') for item in items} - {None}
+        conversations = (
+            Conversation.objects.filter(id__in=ids, user=user)
+            .select_related('archive').defer('archive__data')
+            .in_bulk()
+        )
+
+        turns = []
+        for item in items:
+            conversation = conversations.get(item.get('conversation_id'))
+            messages, summary_updated = self._build_messages(user, conversation, item['message'])
+            turns.append((conversation, messages, summary_updated))
+        return turns
+
+    def _save_turn(self, user, conversation, message_text, bot_response, summary_updated=False, details=None):
+        """
+        Save the user message and the bot reply, and move the conversation's
+        last_message_at, in one short transaction.
+
+        ``details`` are the completion_details() of the reply, if it came
+        from OpenAI; they are stored on the bot message and added to the
+        user's DailyUsage.
+        """
+        details = details or {}
+        with transaction.atomic():
+            existing = conversation is not None
+            if not existing:
+                conversation = Conversation.objects.create(user=user)
+
+            messages = Message.objects.bulk_create([
+                Message(conversation=conversation, content=message_text, is_user=True),
+                Message(conversation=conversation, content=bot_response, is_user=False, **details),
+            ])
+            changes = conversation_changes(messages)
+            if summary_updated:
+                changes.update(summary=conversation.summary, summarized_through=conversation.summarized_through)
+            Conversation.objects.filter(id=conversation.id).update(**changes)
+            conversation.last_message_at = changes["last_message_at"]
+            if existing:
+                archive.restore_archived([conversation])
+            if details:
+                DailyUsage.objects.record(
+                    user,
+                    timezone.localdate(),
+                    details["prompt_tokens"],
+                    details["completion_tokens"],
+                    details["latency_ms"],
+                )
+        return conversation
+
+    def _save_batch(self, user, items, turns, replies):
+        """
+        _save_turn for a batch, in one transaction: new conversations and
+        all the messages are inserted with bulk_create and the usage is
+        added to DailyUsage at once. Returns the conversation of each item.
+        """
+        with transaction.atomic():
+            new_conversations = [Conversation(user=user) for conversation, _, _ in turns if conversation is None]
+            Conversation.objects.bulk_create(new_conversations)
+            created = iter(new_conversations)
+            conversations = [conversation or next(created) for conversation, _, _ in turns]
+
+            messages = []
+            for conversation, item, (bot_response, details) in zip(conversations, items, replies):
+                messages.append(Message(conversation=conversation, content=item['message'], is_user=True))
+                messages.append(Message(conversation=conversation, content=bot_response, is_user=False, **(details or {})))
+            Message.objects.bulk_create(messages, batch_size=500)
+
+            # One UPDATE per conversation, however many items it had
+            by_conversation = {}
+            for message in messages:
+                by_conversation.setdefault(message.conversation_id, []).append(message)
+            changes = {
+                conversation_id: conversation_changes(new_messages)
+                for conversation_id, new_messages in by_conversation.items()
+            }
+            for conversation, _, summary_updated in turns:
+                if summary_updated:
+                    changes[conversation.id].update(
+                        summary=conversation.summary,
+                        summarized_through=conversation.summarized_through,
+                    )
+            for conversation_id, fields in changes.items():
+                Conversation.objects.filter(id=conversation_id).update(**fields)
+            for conversation in conversations:
+                conversation.last_message_at = changes[conversation.id]["last_message_at"]
+            archive.restore_archived([conversation for conversation, _, _ in turns if conversation is not None])
+
+            usage = [details for _, details in replies if details]
+            if usage:
+                DailyUsage.objects.record(
+                    user,
+                    timezone.localdate(),
+                    sum(details["prompt_tokens"] or 0 for details in usage),
+                    sum(details["completion_tokens"] or 0 for details in usage),
+                    sum(details["latency_ms"] for details in usage),
+                    completions=len(usage),
+                    max_latency_ms=max(details["latency_ms"] for details in usage),
+                )
+        return conversations
+
+    def _complete(self, messages):
+        """
+        Return the reply to messages and its completion_details(), or the
+        cached reply and no details if the completion cache is enabled.
+        """
+        cache_key = None
+        if completion_cache.is_enabled():
+            cache_key = completion_cache.make_key(CHAT_MODEL, COMPLETION_PARAMS, messages)
+            cached = completion_cache.lookup(cache_key)
+            if cached is not None:
+                return cached, None
+
+        bot_response, details = self._call_upstream(messages)
+        if cache_key is not None:
+            completion_cache.store(cache_key, bot_response)
+        return bot_response, details
+
+    def _call_upstream(self, messages):
+        """Return the reply to messages from OpenAI and its completion_details()"""
+        with upstream_slot(), metrics.upstream_call():
+            started = time.perf_counter()
+            response = get_openai_client().chat.completions.create(
+                model=CHAT_MODEL,
+                messages=messages,
+                **COMPLETION_PARAMS,
+            )
+        metrics.record_usage(response.usage)
+
+        # Extract response text
+        choice = response.choices[0]
+        return choice.message.content.strip(), completion_details(
+            response.model, response.usage, choice.finish_reason, started
+        )
+
+    async def _acomplete(self, messages):
+        """Async version of _complete"""
+        if not has_long_lived_loop():
+            # Under WSGI: see clients.has_long_lived_loop()
+            return await sync_to_async(self._complete)(messages)
+
+        cache_key = None
+        if completion_cache.is_enabled():
+            cache_key = completion_cache.make_key(CHAT_MODEL, COMPLETION_PARAMS, messages)
+            cached = await sync_to_async(completion_cache.lookup)(cache_key)
+            if cached is not None:
+                return cached, None
+
+        # Call OpenAI API
+        async with async_upstream_slot():
+            with metrics.upstream_call():
+                started = time.perf_counter()
+                response = await get_async_openai_client().chat.completions.create(
+                    model=CHAT_MODEL,
+                    messages=messages,
+                    **COMPLETION_PARAMS,
+                )
+        metrics.record_usage(response.usage)
+
+        # Extract response text
+        choice = response.choices[0]
+        bot_response = choice.message.content.strip()
+        if cache_key is not None:
+            await sync_to_async(completion_cache.store)(cache_key, bot_response)
+        return bot_response, completion_details(response.model, response.usage, choice.finish_reason, started)
+
     def get_chat_response(self, user, message_text, conversation_id=None):
         """
         Get a response from the OpenAI API and save the conversation
         """
-        # Get or create conversation
-        if conversation_id:
+        conversation, messages, summary_updated = self._prepare_turn(
+            user, message_text, conversation_id
+        )
+
+        details = None
+        try:
+            bot_response, details = self._complete(messages)
+        except Exception as e:
+            # Handle errors
+            bot_response = f"Sorry, I encountered an error: {str(e)}"
+
+        conversation = self._save_turn(
+            user, conversation, message_text, bot_response, summary_updated, details
+        )
+        return {
+            "conversation_id": conversation.id,
+            "message": bot_response
+        }
+
+    def get_chat_responses(self, user, items, concurrency=1):
+        """
+        Answer a batch of ``{"message", "conversation_id"}`` items, running
+        up to ``concurrency`` upstream calls at once, and return a
+        get_chat_response() result per item, in order.
+
+        Each item is answered from its conversation as it was before the
+        batch, so items sent to the same conversation don't see each
+        other's replies; all the turns are saved in order once every reply
+        is in.
+        """
+        turns = self._prepare_batch(user, items)
+
+        def complete(messages):
             try:
-                conversation = Conversation.objects.get(id=conversation_id, user=user)
-            except Conversation.DoesNotExist:
-                conversation = Conversation.objects.create(user=user)
-        else:
-            conversation = Conversation.objects.create(user=user)
-        
-        # Save user message
-        user_message = Message.objects.create(
-            conversation=conversation,
-            content=message_text,
-            is_user=True
+                return self._complete(messages)
+            except Exception as e:
+                # Handle errors
+                return f"Sorry, I encountered an error: {str(e)}", None
+
+        # Each call runs in a copy of this context, so it is counted in the
+        # request's metrics
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='chat-batch') as pool:
+            futures = [
+                pool.submit(contextvars.copy_context().run, complete, messages)
+                for _, messages, _ in turns
+            ]
+            replies = [future.result() for future in futures]
+
+        conversations = self._save_batch(user, items, turns, replies)
+        return [
+            {"conversation_id": conversation.id, "message": bot_response}
+            for conversation, (bot_response, _) in zip(conversations, replies)
+        ]
+
+    async def aget_chat_response(self, user, message_text, conversation_id=None):
+        """
+        Async version of get_chat_response, for ASGI views.
+
+        The upstream call is awaited on the event loop, so waiting for OpenAI
+        does not hold a thread.
+        """
+        conversation, messages, summary_updated = await sync_to_async(self._prepare_turn)(
+            user, message_text, conversation_id
         )
-        
-        # Get conversation history (last 10 messages)
-        history = conversation.messages.order_by('created_at')[:10]
-        
-        # Format messages for OpenAI
-        messages = [{"role": "system", "content": "You are a helpful assistant."}]
-        
-        for msg in history:
-            role = "user" if msg.is_user else "assistant"
-            messages.append({"role": role, "content": msg.content})
-        
-        # If the user's newest message isn't in history yet, add it
-        if user_message not in history:
-            messages.append({"role": "user", "content": message_text})
-        
+
+        details = None
         try:
-            # Call OpenAI API
-            response = openai.chat.completions.create(
-                model="gpt-4o-mini",  # or any other model you prefer
-                messages=messages,
-                max_tokens=500,
-                temperature=0.7,
-            )
-            
-            # Extract response text
-            bot_response = response.choices[0].message.content.strip()
-            
-            # Save bot response
-            bot_message = Message.objects.create(
-                conversation=conversation,
-                content=bot_response,
-                is_user=False
-            )
-            
-            return {
-                "conversation_id": conversation.id,
-                "message": bot_response
-            }
-            
+            bot_response, details = await self._acomplete(messages)
+        except Exception as e:
+            # Handle errors
+            bot_response = f"Sorry, I encountered an error: {str(e)}"
+
+        conversation = await sync_to_async(self._save_turn)(
+            user, conversation, message_text, bot_response, summary_updated, details
+        )
+        return {
+            "conversation_id": conversation.id,
+            "message": bot_response
+        }
+
+    async def stream_chat_response(self, user, message_text, conversation_id=None):
+        """
+        Stream a response from the OpenAI API as it is generated.
+
+        Yields ``(event, data)`` tuples: a ``delta`` event per completion
+        chunk and a final ``done`` (or ``error``) event, carrying the
+        conversation id, once the turn has been saved.
+        """
+        conversation, messages, summary_updated = await sync_to_async(self._prepare_turn)(
+            user, message_text, conversation_id
+        )
+
+        cache_key = None
+        cached = None
+        if completion_cache.is_enabled():
+            cache_key = completion_cache.make_key(CHAT_MODEL, COMPLETION_PARAMS, messages)
+            cached = await sync_to_async(completion_cache.lookup)(cache_key)
+
+        parts = []
+        details = None
+        started = model = finish_reason = usage = None
+        try:
+            if cached is not None:
+                parts.append(cached)
+                yield "delta", {"content": cached}
+            elif not has_long_lived_loop():
+                # Under WSGI (see clients.has_long_lived_loop()) Django sends
+                # the stream as one body once it ends, so the reply is fetched
+                # in one piece with the sync client
+                bot_response, details = await sync_to_async(self._call_upstream)(messages)
+                parts.append(bot_response)
+                yield "delta", {"content": bot_response}
+            else:
+                async with async_upstream_slot():
+                    started = time.perf_counter()
+                    with metrics.upstream_call():
+                        stream = await get_async_openai_client().chat.completions.create(
+                            model=CHAT_MODEL,
+                            messages=messages,
+                            stream=True,
+                            # The usage comes in a final chunk without choices
+                            stream_options={"include_usage": True},
+                            **COMPLETION_PARAMS,
+                        )
+                    # Closes the upstream response if the client leaves early
+                    async with stream:
+                        async for chunk in stream:
+                            model = chunk.model
+                            if chunk.usage:
+                                usage = chunk.usage
+                                metrics.record_usage(usage)
+                            if not chunk.choices:
+                                continue
+                            finish_reason = chunk.choices[0].finish_reason or finish_reason
+                            delta = chunk.choices[0].delta.content
+                            if delta:
+                                parts.append(delta)
+                                yield "delta", {"content": delta}
+                    details = completion_details(model, usage, finish_reason, started)
+        except (asyncio.CancelledError, GeneratorExit):
+            # The client went away mid-stream. The completion was still paid
+            # for, so save the turn with the part of the reply received so
+            # far, shielded from a second cancellation, before giving up
+            if started is not None:
+                details = completion_details(model, usage, finish_reason, started)
+            await asyncio.shield(sync_to_async(self._save_turn)(
+                user, conversation, message_text, "".join(parts).strip(), summary_updated, details
+            ))
+            raise
         except Exception as e:
             # Handle errors
             error_message = f"Sorry, I encountered an error: {str(e)}"
-            Message.objects.create(
-                conversation=conversation,
-                content=error_message,
-                is_user=False
+            conversation = await sync_to_async(self._save_turn)(
+                user, conversation, message_text, error_message, summary_updated
             )
-            return {
-                "conversation_id": conversation.id,
-                "message": error_message
-            }
\ No newline at end of file
+            yield "error", {"conversation_id": conversation.id, "message": error_message}
+            return
+
+        # Save the turn once the stream has closed
+        bot_response = "".join(parts).strip()
+        if cache_key is not None and cached is None:
+            await sync_to_async(completion_cache.store)(cache_key, bot_response)
+        conversation = await sync_to_async(self._save_turn)(
+            user, conversation, message_text, bot_response, summary_updated, details
+        )
+        yield "done", {"conversation_id": conversation.id, "message": bot_response}
@@ -0,0 +1,25 @@
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.test import TestCase
+
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from ..services import ChatbotService
+
+FAST_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+
+class APITestCase(TestCase):
+    """A user with a token and an API client authenticated with it"""
+
+    def setUp(self):
+        caches['throttle'].clear()
+        self.user = User.objects.create_user('alice')
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+
+    def add_turn(self, conversation, text, reply="Reply"):
+        """Save a chat turn the way the chat endpoints do, without calling OpenAI"""
+        return ChatbotService()._save_turn(self.user, conversation, text, reply)
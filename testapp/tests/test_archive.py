@@ -0,0 +1,64 @@
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .. import archive, search
+from ..models import Conversation, ConversationArchive
+from .base import APITestCase
+
+
+class ArchiveTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.conversation = None
+        for i in range(3):
+            self.conversation = self.add_turn(self.conversation, f"Question {i}", f"Answer {i}")
+        self.url = f'/api/chat/conversations/{self.conversation.id}/'
+
+    def test_round_trip(self):
+        before = list(self.conversation.messages.order_by('id').values())
+        response = self.client.get(self.url).json()
+
+        self.assertEqual(archive.archive_conversation(self.conversation)[0], 6)
+        self.assertFalse(self.conversation.messages.exists())
+        self.assertEqual(self.client.get(self.url).json(), response)
+        self.assertEqual(search.search_messages(self.user, "Question", limit=10)[0], [])
+
+        self.assertTrue(archive.restore_conversation(self.conversation))
+        self.assertFalse(ConversationArchive.objects.exists())
+        self.assertEqual(list(self.conversation.messages.order_by('id').values()), before)
+        self.assertEqual(len(search.search_messages(self.user, "Question", limit=10)[0]), 3)
+
+    def test_counters_are_kept(self):
+        archive.archive_conversation(self.conversation)
+        result = self.client.get('/api/chat/conversations/', {'summary': 'true'}).json()['results'][0]
+        self.assertEqual(result['message_count'], 6)
+        self.assertEqual(result['last_message_preview'], "Answer 2")
+
+    def test_idle_conversations(self):
+        empty = Conversation.objects.create(user=self.user)
+        old = timezone.now() - timedelta(days=100)
+        Conversation.objects.filter(id__in=[self.conversation.id, empty.id]).update(last_message_at=old)
+
+        self.assertEqual(list(archive.idle_conversations(90)), [self.conversation])
+        archive.archive_conversation(self.conversation)
+        self.assertEqual(list(archive.idle_conversations(90)), [])
+
+    def test_turn_saved_after_archiving(self):
+        # Read for the turn, then archived while the reply was generated
+        conversation = Conversation.objects.select_related('archive').get(id=self.conversation.id)
+        archive.archive_conversation(self.conversation)
+        self.add_turn(conversation, "Question 3", "Answer 3")
+
+        self.assertFalse(ConversationArchive.objects.exists())
+        messages = self.client.get(self.url).json()['messages']
+        self.assertEqual([m['content'] for m in messages[-4:]], ["Question 2", "Answer 2", "Question 3", "Answer 3"])
+        self.assertEqual(len(messages), 8)
+
+    def test_not_archived_if_no_longer_idle(self):
+        cutoff = timezone.now() - timedelta(days=90)
+        self.assertEqual(archive.archive_conversation(self.conversation, idle_before=cutoff), (0, 0, 0))
+        self.assertFalse(ConversationArchive.objects.exists())
+
+        Conversation.objects.filter(id=self.conversation.id).update(last_message_at=cutoff - timedelta(days=1))
+        self.assertEqual(archive.archive_conversation(self.conversation, idle_before=cutoff)[0], 6)
@@ -0,0 +1,114 @@
+import asyncio
+from importlib import import_module
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.test import AsyncClient, Client
+
+from .. import archive, clients
+from ..benchmarking import stub_upstream
+from ..models import Conversation
+from ..openai_stub import DEFAULT_REPLY
+from .base import APITestCase
+
+
+class AsyncViewAuthenticationTests(APITestCase):
+    def test_session_requests_need_a_csrf_token(self):
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.user)
+        response = client.post('/api/async/chat/conversations/new/')
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(Conversation.objects.exists())
+
+    def test_token_requests(self):
+        client = Client(enforce_csrf_checks=True, headers={'Authorization': f"Token {self.token.key}"})
+        self.assertEqual(client.post('/api/async/chat/conversations/new/').status_code, 201)
+
+    def test_json_only(self):
+        client = Client(enforce_csrf_checks=True, headers={'Authorization': f"Token {self.token.key}"})
+        response = client.post('/api/async/chat/message/', 'message=hi', content_type='text/plain')
+        self.assertEqual(response.status_code, 415)
+
+
+class UpstreamClientTests(APITestCase):
+    """Async views use the async OpenAI client only when served by ASGI"""
+
+    def setUp(self):
+        super().setUp()
+        self.auth = {'Authorization': f"Token {self.token.key}"}
+
+    def test_wsgi_uses_the_sync_client(self):
+        with stub_upstream(0) as stub:
+            response = Client().post(
+                '/api/async/chat/message/', {'message': "Hello"}, content_type='application/json', headers=self.auth
+            )
+            self.assertEqual(response.json()["message"], DEFAULT_REPLY)
+            self.assertEqual(stub.requests, 1)
+            self.assertEqual(len(clients._async_clients), 0)
+
+    @mock.patch('testapp.clients._serving_asgi', True)
+    async def test_asgi_uses_the_async_client(self):
+        with stub_upstream(0) as stub:
+            response = await AsyncClient().post(
+                '/api/async/chat/message/', {'message': "Hello"}, content_type='application/json', headers=self.auth
+            )
+            self.assertEqual(response.json()["message"], DEFAULT_REPLY)
+            self.assertEqual(stub.requests, 1)
+            self.assertIn(asyncio.get_running_loop(), clients._async_clients)
+
+    def test_asgi_entry_point(self):
+        self.assertFalse(clients.has_long_lived_loop())
+        try:
+            import_module('practiceproject.asgi')
+            self.assertTrue(clients.has_long_lived_loop())
+        finally:
+            clients.serve_asgi(False)
+
+
+class AsyncChatViewTests(APITestCase):
+    """The async views answer as the sync DRF views do"""
+
+    def setUp(self):
+        super().setUp()
+        self.conversation = None
+        for i in range(3):
+            self.conversation = self.add_turn(self.conversation, f"Question {i}", f"Answer {i}")
+        self.auth = {'Authorization': f"Token {self.token.key}"}
+        self.async_client = AsyncClient()
+
+    async def assertSameAsSync(self, path, params=None):
+        expected = await sync_to_async(self.client.get)(f'/api{path}', params)
+        response = await self.async_client.get(f'/api/async{path}', params, headers=self.auth)
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertEqual(response.json(), expected.json())
+        self.assertEqual(response.get('ETag'), expected.get('ETag'))
+
+    async def test_conversations(self):
+        await self.assertSameAsSync('/chat/conversations/')
+        await self.assertSameAsSync('/chat/conversations/', {'summary': 'true', 'page_size': 1})
+
+    async def test_conversation(self):
+        path = f'/chat/conversations/{self.conversation.id}/'
+        await self.assertSameAsSync(path)
+        await self.assertSameAsSync(path, {'limit': 2})
+        await sync_to_async(archive.archive_conversation)(self.conversation)
+        await self.assertSameAsSync(path)
+        await self.assertSameAsSync(path, {'limit': 2})
+
+    async def test_other_users_conversation(self):
+        other = await User.objects.acreate(username='bob')
+        conversation = await Conversation.objects.acreate(user=other)
+        response = await self.async_client.get(
+            f'/api/async/chat/conversations/{conversation.id}/', headers=self.auth
+        )
+        self.assertEqual(response.status_code, 404)
+
+    async def test_chat_message(self):
+        with stub_upstream(0):
+            response = await self.async_client.post(
+                '/api/async/chat/message/', {'message': "Hello", 'conversation_id': self.conversation.id},
+                content_type='application/json', headers=self.auth,
+            )
+        self.assertEqual(response.json(), {"conversation_id": self.conversation.id, "message": DEFAULT_REPLY})
+        self.assertEqual(await self.conversation.messages.acount(), 8)
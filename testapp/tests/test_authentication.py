@@ -0,0 +1,52 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.test import override_settings
+
+from ..authentication import CachedTokenAuthentication
+from .base import APITestCase
+
+
+class CachedTokenAuthenticationTests(APITestCase):
+    def authenticate(self, key=None):
+        return CachedTokenAuthentication().authenticate_credentials(key or self.token.key)[0]
+
+    def test_cached(self):
+        self.authenticate()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.authenticate(), self.user)
+
+    def test_new_instance_per_request(self):
+        first = self.authenticate()
+        first.first_name = "Changed"
+        second = self.authenticate()
+        self.assertIsNot(first, second)
+        self.assertEqual(second.first_name, '')
+
+    def test_deleted_token(self):
+        self.authenticate()
+        self.token.delete()
+        self.assertEqual(self.client.get('/api/user/').status_code, 401)
+
+    def test_deactivated_user(self):
+        self.authenticate()
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/user/').status_code, 401)
+
+    def test_profile_update(self):
+        self.authenticate()
+        self.user.first_name = "Alice"
+        self.user.save()
+        self.assertEqual(self.authenticate().first_name, "Alice")
+
+    def test_password_not_cached(self):
+        self.user.set_password('Secret-password-1')
+        self.user.save()
+        self.authenticate()
+        user = self.authenticate()
+        self.assertEqual(user.get_deferred_fields(), {'password'})
+        self.assertTrue(user.check_password('Secret-password-1'))
+
+    @override_settings(AUTH_TOKEN_SHARED_CACHE='default')
+    def test_shared_cache_must_be_shared(self):
+        with self.assertRaises(ImproperlyConfigured):
+            self.authenticate()
@@ -0,0 +1,56 @@
+import time
+
+from django.test import override_settings
+
+from ..benchmarking import stub_upstream
+from ..models import Conversation, Message
+from ..openai_stub import DEFAULT_REPLY
+from ..throttling import take_token
+from .base import APITestCase
+
+
+class ChatBatchTests(APITestCase):
+    def batch(self, messages):
+        return self.client.post('/api/chat/batch/', {'messages': messages}, format='json')
+
+    def test_results_in_order(self):
+        conversation = self.add_turn(None, "Earlier")
+        with stub_upstream(0) as stub:
+            response = self.batch([
+                {'message': "First"},
+                {'message': ""},
+                {'message': "Second", 'conversation_id': conversation.id},
+            ])
+        self.assertEqual(response.status_code, 200)
+        first, invalid, second = response.data["results"]
+        self.assertEqual(first["message"], DEFAULT_REPLY)
+        self.assertIn('message', invalid["errors"])
+        self.assertEqual(second, {"conversation_id": conversation.id, "message": DEFAULT_REPLY})
+        self.assertEqual(stub.requests, 2)
+
+        messages = Message.objects.filter(conversation_id=first["conversation_id"]).order_by('id')
+        self.assertEqual([m.content for m in messages], ["First", DEFAULT_REPLY])
+        conversation.refresh_from_db()
+        self.assertEqual(conversation.message_count, 4)
+
+    @override_settings(CHATBOT_BATCH_CONCURRENCY=4)
+    def test_completions_run_concurrently(self):
+        with stub_upstream(0.3):
+            start = time.perf_counter()
+            response = self.batch([{'message': f"Question {i}"} for i in range(4)])
+            elapsed = time.perf_counter() - start
+        self.assertEqual(len(response.data["results"]), 4)
+        self.assertLess(elapsed, 0.9)
+
+    @override_settings(CHATBOT_BATCH_MAX_ITEMS=2)
+    def test_too_many_messages(self):
+        response = self.batch([{'message': "Hello"}] * 3)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('messages', response.data)
+
+    def test_each_message_counts_against_the_rate_limit(self):
+        for _ in range(8):
+            take_token(self.user)
+        response = self.batch([{'message': f"Question {i}"} for i in range(3)])
+        self.assertEqual(response.status_code, 429)
+        self.assertFalse(Conversation.objects.exists())
@@ -0,0 +1,44 @@
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings
+
+from .. import completion_cache
+from ..benchmarking import stub_upstream
+from ..openai_stub import DEFAULT_REPLY
+from .base import APITestCase
+
+
+class CompletionCacheKeyTests(SimpleTestCase):
+    messages = [{"role": "system", "content": "System"}, {"role": "user", "content": "Hello  there"}]
+
+    def test_whitespace_is_normalized(self):
+        self.assertEqual(
+            completion_cache.make_key('model', {}, self.messages),
+            completion_cache.make_key('model', {}, [self.messages[0], {"role": "user", "content": " Hello\nthere "}]),
+        )
+
+    def test_model_and_parameters_are_part_of_the_key(self):
+        key = completion_cache.make_key('model', {"temperature": 0}, self.messages)
+        self.assertNotEqual(key, completion_cache.make_key('other', {"temperature": 0}, self.messages))
+        self.assertNotEqual(key, completion_cache.make_key('model', {"temperature": 1}, self.messages))
+
+
+class CompletionCacheTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        caches['completions'].clear()
+
+    def chat_twice(self):
+        with stub_upstream(0) as stub:
+            for _ in range(2):
+                response = self.client.post('/api/chat/message/', {'message': "Hello"}, format='json')
+                self.assertEqual(response.data["message"], DEFAULT_REPLY)
+        return stub.requests
+
+    @override_settings(CHATBOT_COMPLETION_CACHE_ENABLED=True)
+    def test_identical_prompts_are_answered_once(self):
+        self.assertEqual(self.chat_twice(), 1)
+        self.assertEqual(completion_cache.stats(), {"hits": 1, "misses": 1})
+
+    def test_disabled_by_default(self):
+        self.assertEqual(self.chat_twice(), 2)
+        self.assertEqual(completion_cache.stats(), {"hits": 0, "misses": 0})
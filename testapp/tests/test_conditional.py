@@ -0,0 +1,43 @@
+from django.contrib.auth.models import User
+
+from ..models import Conversation
+from .base import APITestCase
+
+
+class ConditionalGetTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.conversation = self.add_turn(None, "Hello")
+
+    def test_conversation(self):
+        url = f'/api/chat/conversations/{self.conversation.id}/'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('private', response['Cache-Control'])
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        last_modified = response['Last-Modified']
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+        etag = response['ETag']
+        self.add_turn(self.conversation, "Again")
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_list(self):
+        url = '/api/chat/conversations/'
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # A new, empty conversation changes the list too
+        Conversation.objects.create(user=self.user)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_other_users_conversation(self):
+        other = User.objects.create_user('bob')
+        conversation = Conversation.objects.create(user=other)
+        response = self.client.get(f'/api/chat/conversations/{conversation.id}/', HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,80 @@
+import re
+
+from django.conf import settings
+
+from ..context import ConversationContextManager, estimate_tokens
+from ..models import Conversation
+from ..services import ChatbotService
+from .base import APITestCase
+
+
+class ContextWindowTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.conversation = None
+        for i in range(12):
+            self.conversation = self.add_turn(self.conversation, f"Question {i}", f"Answer {i}")
+        self.context = ConversationContextManager(None, "System")
+
+    def test_most_recent_messages_oldest_first(self):
+        window = self.context.recent_window(self.conversation, 4, 1000)
+        self.assertEqual(
+            [m.content for m in window], ["Question 10", "Answer 10", "Question 11", "Answer 11"]
+        )
+
+    def test_token_budget(self):
+        window = self.context.recent_window(self.conversation, 10, 3 * estimate_tokens("Answer 11"))
+        self.assertEqual([m.content for m in window], ["Answer 10", "Question 11", "Answer 11"])
+
+    def test_one_query(self):
+        with self.assertNumQueries(1):
+            self.context.recent_window(self.conversation, 10, 1000)
+
+
+class ContextSummaryTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.summarized = []
+
+    def summarize(self, previous_summary, messages):
+        self.summarized.extend(m.content for m in messages)
+        return " | ".join(filter(None, [previous_summary] + [m.content for m in messages]))
+
+    def chat(self, conversation, turns, summarize=None):
+        """Run turns through the context manager, returning each turn's prompt"""
+        prompts = []
+        for i in range(turns):
+            context = ConversationContextManager(summarize or self.summarize, "System")
+            prompts.append(context.build_messages(conversation, f"Question {i}"))
+            ChatbotService()._save_turn(
+                self.user, conversation, f"Question {i}", f"Answer {i}", context.summary_updated
+            )
+        return prompts
+
+    def test_every_earlier_turn_is_sent(self):
+        conversation = Conversation.objects.create(user=self.user)
+        prompts = self.chat(conversation, 30)
+        for i, messages in enumerate(prompts):
+            sent = set(re.findall(r"(?:Question|Answer) \d+", " ".join(m["content"] for m in messages)))
+            for earlier in range(i):
+                self.assertIn(f"Question {earlier}", sent)
+                self.assertIn(f"Answer {earlier}", sent)
+            self.assertLessEqual(len(messages), settings.CHATBOT_CONTEXT_MAX_MESSAGES + 2)
+
+    def test_each_message_is_summarized_once_per_batch(self):
+        conversation = Conversation.objects.create(user=self.user)
+        self.chat(conversation, 30)
+        self.assertEqual(len(self.summarized), len(set(self.summarized)))
+        self.assertEqual(len(self.summarized) % settings.CHATBOT_SUMMARY_BATCH_SIZE, 0)
+
+    def test_failed_summary_sends_the_turns_verbatim(self):
+        conversation = Conversation.objects.create(user=self.user)
+
+        def fail(previous_summary, messages):
+            raise ValueError("upstream down")
+
+        with self.assertLogs('testapp.context', 'WARNING'):
+            messages = self.chat(conversation, 8, fail)[-1]
+        self.assertEqual(len(messages), 2 + 7 * 2)
+        conversation.refresh_from_db()
+        self.assertIsNone(conversation.summarized_through)
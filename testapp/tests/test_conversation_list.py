@@ -0,0 +1,43 @@
+from datetime import timedelta
+
+from django.utils import timezone
+
+from ..models import Conversation
+from .base import APITestCase
+
+
+class ConversationPaginationTests(APITestCase):
+    def test_summary_pages_cover_every_conversation_once(self):
+        now = timezone.now()
+        conversations = [Conversation.objects.create(user=self.user) for _ in range(7)]
+        for i, conversation in enumerate(conversations):
+            # Three share a timestamp, so the id has to break the tie
+            conversation.last_message_at = now - timedelta(minutes=min(i, 3))
+            conversation.save()
+
+        ids = []
+        cursor = None
+        while True:
+            params = {'summary': 'true', 'limit': 2}
+            if cursor:
+                params['cursor'] = cursor
+            data = self.client.get('/api/chat/conversations/', params).json()
+            self.assertLessEqual(len(data['results']), 2)
+            ids += [result['id'] for result in data['results']]
+            cursor = data['next_cursor']
+            if cursor is None:
+                break
+
+        expected = sorted(conversations, key=lambda c: (c.last_message_at, c.id), reverse=True)
+        self.assertEqual(ids, [c.id for c in expected])
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/chat/conversations/', {'summary': 'true', 'cursor': 'bogus'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_summary_fields(self):
+        conversation = self.add_turn(None, "Hello")
+        result = self.client.get('/api/chat/conversations/', {'summary': 'true'}).json()['results'][0]
+        self.assertEqual(result['id'], conversation.id)
+        self.assertEqual(result['message_count'], 2)
+        self.assertEqual(result['last_message_preview'], "Reply")
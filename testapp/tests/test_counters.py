@@ -0,0 +1,42 @@
+from io import StringIO
+
+from django.core.management import call_command
+
+from .. import archive
+from ..models import Conversation
+from .base import APITestCase
+
+
+class ReconcileConversationsTests(APITestCase):
+    def reconcile(self, *args):
+        out = StringIO()
+        call_command('reconcile_conversations', *args, stdout=out)
+        return out.getvalue()
+
+    def test_counters_follow_turns(self):
+        conversation = self.add_turn(None, "Hello")
+        self.add_turn(conversation, "Again", "Last reply")
+        conversation.refresh_from_db()
+        self.assertEqual(conversation.message_count, 4)
+        self.assertEqual(conversation.last_message_preview, "Last reply")
+        self.assertIn("0 drifted", self.reconcile())
+
+    def test_drift_is_fixed(self):
+        conversation = self.add_turn(None, "Hello")
+        archived = self.add_turn(None, "Archived")
+        archive.archive_conversation(archived)
+        expected = {
+            c.id: (c.message_count, c.last_message_at, c.last_message_preview)
+            for c in Conversation.objects.all()
+        }
+        Conversation.objects.filter(id=conversation.id).update(message_count=7, last_message_preview="Stale")
+        Conversation.objects.filter(id=archived.id).update(message_count=0)
+
+        self.assertIn("2 drifted, 0 fixed", self.reconcile('--dry-run'))
+        self.assertEqual(Conversation.objects.get(id=conversation.id).message_count, 7)
+
+        self.assertIn("2 drifted, 2 fixed", self.reconcile())
+        self.assertEqual({
+            c.id: (c.message_count, c.last_message_at, c.last_message_preview)
+            for c in Conversation.objects.all()
+        }, expected)
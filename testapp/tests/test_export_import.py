@@ -0,0 +1,84 @@
+import gzip
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import AsyncClient
+
+from .. import archive
+from ..export import export_ndjson
+from ..models import Conversation
+from .base import APITestCase
+
+
+class ExportImportTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        first = self.add_turn(None, "First question", "First answer")
+        self.add_turn(first, "Follow-up", "Second answer")
+        archived = self.add_turn(None, "Archived question", "Archived answer")
+        archive.archive_conversation(archived)
+        Conversation.objects.create(user=self.user)
+
+    def export(self, user):
+        return b"".join(export_ndjson(Conversation.objects.filter(user=user)))
+
+    def history(self, user):
+        """Every conversation's messages, without ids"""
+        return [
+            [
+                (m.content, m.is_user, m.created_at)
+                for m in (archive.archived_messages(c) or c.messages.order_by('created_at', 'id'))
+            ]
+            for c in Conversation.objects.filter(user=user).select_related('archive').order_by('created_at', 'id')
+        ]
+
+    def import_file(self, data, *args):
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'export.ndjson.gz')
+        with gzip.open(path, 'wb') as f:
+            f.write(data)
+        call_command('import_conversations', path, *args, stdout=StringIO())
+
+    def test_endpoint(self):
+        response = self.client.get('/api/chat/export/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(b"".join(response.streaming_content)), self.export(self.user))
+
+        response = self.client.get('/api/chat/export/', HTTP_ACCEPT_ENCODING='gzip;q=0')
+        self.assertNotIn('Content-Encoding', response)
+        records = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        self.assertEqual([record['type'] for record in records].count('message'), 6)
+
+    def test_round_trip(self):
+        other = User.objects.create_user('bob')
+        self.import_file(self.export(self.user), '--user', 'bob')
+
+        self.assertEqual(self.history(other), self.history(self.user))
+        for conversation in Conversation.objects.filter(user=other).with_computed_summary():
+            self.assertEqual(conversation.message_count, conversation.computed_message_count)
+            self.assertEqual(conversation.last_message_at, conversation.computed_last_message_at)
+            self.assertEqual(conversation.last_message_preview, conversation.computed_last_message_preview)
+
+    def test_resume_after_each_chunk(self):
+        other = User.objects.create_user('bob')
+        self.import_file(self.export(self.user), '--user', 'bob', '--chunk-size', '1')
+        self.assertEqual(self.history(other), self.history(self.user))
+        self.assertEqual(Conversation.objects.get(user=other, message_count=4).last_message_preview, "Second answer")
+
+    @mock.patch('testapp.clients._serving_asgi', True)
+    @mock.patch('testapp.export.BUFFER_SIZE', 100)
+    async def test_endpoint_streams_under_asgi(self):
+        client = AsyncClient()
+        headers = {'Authorization': f"Token {self.token.key}"}
+        for encoding, decode in [('gzip', gzip.decompress), ('identity', bytes)]:
+            response = await client.get('/api/chat/export/', headers={**headers, 'Accept-Encoding': encoding})
+            self.assertTrue(response.is_async)
+            chunks = [chunk async for chunk in response.streaming_content]
+            self.assertGreater(len(chunks), 1)
+            self.assertEqual(decode(b"".join(chunks)), await sync_to_async(self.export)(self.user))
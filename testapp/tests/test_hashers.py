@@ -0,0 +1,53 @@
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.test import Client, TestCase, override_settings
+
+SCRYPT_HASHERS = [
+    'testapp.hashers.TunedScryptPasswordHasher',
+    'django.contrib.auth.hashers.MD5PasswordHasher',
+]
+
+
+@override_settings(PASSWORD_HASHERS=SCRYPT_HASHERS, PASSWORD_SCRYPT_WORK_FACTOR=2 ** 4)
+class PasswordHashingTests(TestCase):
+    password = 'Good-password-1!'
+
+    def login(self, password=None):
+        return Client().post('/api/async/login/', {
+            'username': 'carol',
+            'password': password or self.password,
+        }, content_type='application/json')
+
+    def test_parameters_come_from_settings(self):
+        algorithm, n, salt, r, p, hash = make_password(self.password).split('$')
+        self.assertEqual((algorithm, n, r, p), ('scrypt', '16', '8', '1'))
+
+    def test_register(self):
+        response = Client().post('/api/async/register/', {
+            'username': 'carol',
+            'email': 'carol@example.com',
+            'password': self.password,
+            'password2': self.password,
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(User.objects.get().password.startswith('scrypt$'))
+        self.assertEqual(self.login().status_code, 200)
+
+    def test_login_rehashes_with_the_preferred_hasher(self):
+        user = User.objects.create(username='carol', password=make_password(self.password, hasher='md5'))
+        self.assertEqual(self.login().status_code, 200)
+        user.refresh_from_db()
+        self.assertEqual(user.password.split('$')[0], 'scrypt')
+        self.assertTrue(user.check_password(self.password))
+
+    def test_login_rehashes_with_new_parameters(self):
+        user = User.objects.create(username='carol', password=make_password(self.password))
+        with override_settings(PASSWORD_SCRYPT_WORK_FACTOR=2 ** 5):
+            self.assertEqual(self.login().status_code, 200)
+        user.refresh_from_db()
+        self.assertEqual(user.password.split('$')[1], '32')
+
+    def test_wrong_password(self):
+        user = User.objects.create(username='carol', password=make_password(self.password, hasher='md5'))
+        self.assertEqual(self.login('Wrong-password-1!').status_code, 400)
+        self.assertEqual(User.objects.get(id=user.id).password, user.password)
@@ -0,0 +1,77 @@
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.test import override_settings
+from django.utils import timezone
+
+from .. import jobs
+from ..benchmarking import stub_upstream
+from ..models import ChatJob, Message
+from ..openai_stub import DEFAULT_REPLY
+from .base import APITestCase
+
+
+@override_settings(CHATBOT_JOB_WORKERS=0)
+class ChatJobTests(APITestCase):
+    def enqueue(self):
+        response = self.client.post('/api/chat/message/?async=true', {'message': "Hello"}, format='json')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data["status"], ChatJob.PENDING)
+        return response
+
+    def go_stale(self, job):
+        """Make job look as if its worker died"""
+        stale = timezone.now() - timedelta(seconds=121)
+        ChatJob.objects.filter(id=job.id).update(heartbeat_at=stale)
+
+    def test_queued_and_polled(self):
+        location = self.enqueue()['Location']
+        job = jobs.claim_next()
+        self.assertEqual(self.client.get(location).data["status"], ChatJob.RUNNING)
+
+        with stub_upstream(0):
+            jobs.run_job(job)
+        result = self.client.get(location).data
+        self.assertEqual(result["status"], ChatJob.DONE)
+        self.assertEqual(result["message"], DEFAULT_REPLY)
+        self.assertEqual(Message.objects.filter(conversation_id=result["conversation_id"]).count(), 2)
+
+    def test_other_users_job(self):
+        location = self.enqueue()['Location']
+        self.client.force_authenticate(User.objects.create_user('bob'))
+        self.assertEqual(self.client.get(location).status_code, 404)
+
+    def test_claimed_once(self):
+        self.enqueue()
+        self.assertIsNotNone(jobs.claim_next())
+        self.assertIsNone(jobs.claim_next())
+
+    def test_long_running_job_is_not_reclaimed(self):
+        self.enqueue()
+        job = jobs.claim_next()
+        ChatJob.objects.filter(id=job.id).update(started_at=timezone.now() - timedelta(hours=1))
+        self.assertIsNone(jobs.claim_next())
+
+    def test_stale_job_is_reclaimed(self):
+        self.enqueue()
+        job = jobs.claim_next()
+        self.go_stale(job)
+        reclaimed = jobs.claim_next()
+        self.assertEqual(reclaimed.id, job.id)
+        self.assertGreater(reclaimed.started_at, job.started_at)
+
+    def test_only_the_owner_records_the_result(self):
+        self.enqueue()
+        job = jobs.claim_next()
+        self.go_stale(job)
+        owner = jobs.claim_next()
+
+        with stub_upstream(0), self.assertLogs('testapp.jobs', 'WARNING'):
+            jobs.run_job(job)
+        owner.refresh_from_db()
+        self.assertEqual(owner.status, ChatJob.RUNNING)
+
+        with stub_upstream(0):
+            jobs.run_job(owner)
+        owner.refresh_from_db()
+        self.assertEqual(owner.status, ChatJob.DONE)
@@ -0,0 +1,35 @@
+from .. import archive
+from .base import APITestCase
+
+
+class MessagePaginationTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.conversation = None
+        for i in range(3):
+            self.conversation = self.add_turn(self.conversation, f"Question {i}", f"Answer {i}")
+        self.ids = list(self.conversation.messages.order_by('created_at', 'id').values_list('id', flat=True))
+        self.url = f'/api/chat/conversations/{self.conversation.id}/'
+
+    def page(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        return [message['id'] for message in data['messages']], data['has_more']
+
+    def check_pages(self):
+        self.assertEqual(self.page(limit=2), (self.ids[4:], True))
+        self.assertEqual(self.page(limit=2, before=self.ids[4]), (self.ids[2:4], True))
+        self.assertEqual(self.page(limit=2, before=self.ids[2]), (self.ids[:2], False))
+        self.assertEqual(self.page(limit=4, after=self.ids[0]), (self.ids[1:5], True))
+        self.assertEqual(self.page(limit=4, after=self.ids[3]), (self.ids[4:], False))
+
+    def test_pages(self):
+        self.check_pages()
+
+    def test_pages_of_an_archived_conversation(self):
+        archive.archive_conversation(self.conversation)
+        self.check_pages()
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get(self.url, {'before': 'x'}).status_code, 400)
@@ -0,0 +1,59 @@
+import re
+
+from django.contrib.auth.models import User
+from django.test import Client, override_settings
+
+from ..benchmarking import stub_upstream
+from .base import APITestCase
+
+
+class ServerTimingTests(APITestCase):
+    def timings(self, response):
+        return dict(re.findall(r'(\w+);(?:dur=[\d.]+;)?desc="([^"]*)"', response['Server-Timing']))
+
+    def test_database_queries(self):
+        self.add_turn(None, "Hello")
+        timings = self.timings(self.client.get('/api/chat/conversations/'))
+        self.assertRegex(timings["db"], r"^[1-9]\d* queries$")
+        self.assertEqual(timings["upstream"], "0 calls")
+
+    def test_upstream_calls_and_tokens(self):
+        with stub_upstream(0):
+            response = self.client.post('/api/chat/message/', {'message': "Hello"}, format='json')
+        timings = self.timings(response)
+        self.assertEqual(timings["upstream"], "1 calls")
+        self.assertRegex(timings["tokens"], r"^prompt=\d+ completion=\d+$")
+
+    def test_histograms(self):
+        self.client.get('/api/chat/conversations/')
+        staff = User.objects.create_user('staff', is_staff=True)
+        self.client.force_login(staff)
+        body = self.client.get('/api/metrics/').content.decode()
+        self.assertIn('chatbot_request_duration_seconds_count{view="get_conversations"}', body)
+        self.assertIn('chatbot_db_queries_bucket{view="get_conversations",le="+Inf"}', body)
+
+
+class MetricsAccessTests(APITestCase):
+    def get(self, **headers):
+        return Client(headers=headers).get('/api/metrics/')
+
+    def test_private_by_default(self):
+        self.assertEqual(self.get().status_code, 403)
+        self.assertEqual(self.get(Authorization="Bearer ").status_code, 403)
+
+    def test_staff(self):
+        client = Client()
+        client.force_login(User.objects.create_user('staff', is_staff=True))
+        self.assertEqual(client.get('/api/metrics/').status_code, 200)
+        client.force_login(self.user)
+        self.assertEqual(client.get('/api/metrics/').status_code, 403)
+
+    @override_settings(METRICS_TOKEN='scrape-me')
+    def test_bearer_token(self):
+        self.assertEqual(self.get(Authorization="Bearer scrape-me").status_code, 200)
+        self.assertEqual(self.get(Authorization="Bearer wrong").status_code, 403)
+        self.assertEqual(self.get(Authorization=f"Token {self.token.key}").status_code, 403)
+
+    @override_settings(METRICS_ALLOWED_IPS=['127.0.0.1'])
+    def test_allowed_addresses(self):
+        self.assertEqual(self.get().status_code, 200)
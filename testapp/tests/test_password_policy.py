@@ -0,0 +1,44 @@
+from django.contrib.auth.models import User
+from django.test import Client, TestCase, override_settings
+
+from .base import FAST_HASHERS
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class PasswordPolicyTests(TestCase):
+    def register(self, password, username='carol'):
+        return Client().post('/api/register/', {
+            'username': username,
+            'email': f'{username}@example.com',
+            'password': password,
+            'password2': password,
+        }, content_type='application/json')
+
+    def test_every_violation_is_reported(self):
+        response = self.register('xqz')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['password'], [
+            "Password must be at least 8 characters long.",
+            "Password must contain at least one uppercase letter.",
+            "Password must contain at least one number.",
+            "Password must contain at least one special character.",
+        ])
+
+    def test_numeric_and_common(self):
+        errors = self.register('12345678').json()['password']
+        self.assertIn("This password is entirely numeric.", errors)
+        self.assertIn("This password is too common.", errors)
+
+    def test_similar_to_username(self):
+        errors = self.register('Carolinus-1!', username='carolinus').json()['password']
+        self.assertEqual(errors, ["The password is too similar to the username."])
+
+    def test_mismatch(self):
+        response = Client().post('/api/register/', {
+            'username': 'carol', 'password': 'Good-password-1!', 'password2': 'Other-password-1!',
+        }, content_type='application/json')
+        self.assertEqual(response.json(), {'password2': ["Passwords don't match"]})
+
+    def test_valid(self):
+        self.assertEqual(self.register('Good-password-1!').status_code, 201)
+        self.assertTrue(User.objects.get(username='carol').check_password('Good-password-1!'))
@@ -0,0 +1,42 @@
+from unittest import mock
+
+from django.db import connection
+
+from ..benchmarking import stub_upstream
+from ..models import Conversation, DailyUsage, Message
+from ..services import ChatbotService
+from .base import APITestCase
+
+
+class SaveTurnTests(APITestCase):
+    def test_one_insert_and_one_update(self):
+        conversation = self.add_turn(None, "Hello")
+        # The savepoint (a transaction outside tests), both messages in one
+        # INSERT, the conversation's counters in one UPDATE, the check for
+        # an archive made meanwhile, and the release
+        with self.assertNumQueries(5):
+            self.add_turn(conversation, "Again")
+        self.assertEqual(conversation.messages.count(), 4)
+
+    def test_all_or_nothing(self):
+        details = {"model": "m", "prompt_tokens": 1, "completion_tokens": 1, "finish_reason": "stop", "latency_ms": 1}
+        with mock.patch.object(DailyUsage.objects, 'record', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                ChatbotService()._save_turn(self.user, None, "Hello", "Reply", details=details)
+        self.assertFalse(Conversation.objects.exists())
+        self.assertFalse(Message.objects.exists())
+
+    def test_upstream_call_outside_the_transaction(self):
+        atomic_blocks = []
+        service = ChatbotService()
+        call_upstream = service._call_upstream
+
+        def record_transaction(messages):
+            atomic_blocks.append(len(connection.atomic_blocks))
+            return call_upstream(messages)
+
+        outside = len(connection.atomic_blocks)
+        with stub_upstream(0), mock.patch.object(service, '_call_upstream', record_transaction):
+            service.get_chat_response(self.user, "Hello")
+        self.assertEqual(atomic_blocks, [outside])
+        self.assertEqual(Message.objects.count(), 2)
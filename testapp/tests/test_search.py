@@ -0,0 +1,49 @@
+from django.contrib.auth.models import User
+
+from .. import search
+from ..models import Conversation, Message
+from .base import APITestCase
+
+
+class SearchIndexTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.conversation = Conversation.objects.create(user=self.user)
+
+    def search(self, text, user=None):
+        results, _ = search.search_messages(user or self.user, text, limit=10)
+        return [result.id for result in results]
+
+    def test_insert(self):
+        message = Message.objects.create(conversation=self.conversation, content="The quick brown fox", is_user=True)
+        self.assertEqual(self.search("quick"), [message.id])
+        self.assertEqual(self.search("qui"), [message.id])
+        self.assertEqual(self.search("quick fox"), [message.id])
+        self.assertEqual(self.search("slow"), [])
+
+    def test_update(self):
+        message = Message.objects.create(conversation=self.conversation, content="The quick brown fox", is_user=True)
+        message.content = "A lazy dog"
+        message.save()
+        self.assertEqual(self.search("quick"), [])
+        self.assertEqual(self.search("lazy"), [message.id])
+
+    def test_delete(self):
+        message = Message.objects.create(conversation=self.conversation, content="The quick brown fox", is_user=True)
+        message.delete()
+        self.assertEqual(self.search("quick"), [])
+
+    def test_only_own_messages(self):
+        other = User.objects.create_user('bob')
+        conversation = Conversation.objects.create(user=other)
+        Message.objects.create(conversation=conversation, content="The quick brown fox", is_user=True)
+        self.assertEqual(self.search("quick"), [])
+
+    def test_owner_is_not_searched(self):
+        Message.objects.create(conversation=self.conversation, content="Hello", is_user=True)
+        self.assertEqual(self.search(f"u{self.user.pk}"), [])
+
+    def test_endpoint_highlights_matches(self):
+        Message.objects.create(conversation=self.conversation, content="<b>quick</b> fox", is_user=True)
+        result = self.client.get('/api/chat/search/', {'q': 'quick'}).json()['results'][0]
+        self.assertEqual(result['snippet'], "&lt;b&gt;<mark>quick</mark>&lt;/b&gt; fox")
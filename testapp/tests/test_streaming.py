@@ -0,0 +1,65 @@
+import asyncio
+import json
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.test import Client
+
+from ..benchmarking import stub_upstream
+from ..models import Message
+from ..openai_stub import DEFAULT_REPLY
+from ..services import ChatbotService
+from .base import APITestCase
+
+
+def parse_sse(body):
+    """Split a Server-Sent Events body into (event, data) pairs"""
+    events = []
+    for block in body.decode().strip().split("\n\n"):
+        event, data = block.split("\n")
+        events.append((event.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+    return events
+
+
+class StreamingTests(APITestCase):
+    def test_events(self):
+        client = Client(headers={'Authorization': f"Token {self.token.key}"})
+        with stub_upstream(0):
+            response = client.post('/api/chat/message/stream/', {'message': "Hello"}, content_type='application/json')
+            events = parse_sse(b''.join(response))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(events[-1][0], "done")
+        self.assertEqual("".join(data["content"] for event, data in events[:-1]), DEFAULT_REPLY)
+        messages = Message.objects.filter(conversation_id=events[-1][1]["conversation_id"]).order_by('id')
+        self.assertEqual([m.content for m in messages], ["Hello", DEFAULT_REPLY])
+
+
+@mock.patch('testapp.clients._serving_asgi', True)
+class StreamDisconnectTests(APITestCase):
+    """A client leaving mid-stream still gets the turn, with the reply so far, saved"""
+
+    def assertPartialTurnSaved(self):
+        user_message, reply = Message.objects.order_by('id')
+        self.assertEqual(user_message.content, "Hello")
+        self.assertTrue(DEFAULT_REPLY.startswith(reply.content))
+        self.assertLess(len(reply.content), len(DEFAULT_REPLY))
+        self.assertIsNotNone(reply.latency_ms)
+
+    async def test_stream_closed(self):
+        with stub_upstream(1):
+            events = ChatbotService().stream_chat_response(self.user, "Hello")
+            event, data = await anext(events)
+            self.assertEqual(event, "delta")
+            await events.aclose()
+        await sync_to_async(self.assertPartialTurnSaved)()
+
+    async def test_request_cancelled(self):
+        with stub_upstream(1):
+            events = ChatbotService().stream_chat_response(self.user, "Hello")
+            await anext(events)
+            task = asyncio.ensure_future(anext(events))
+            await asyncio.sleep(0)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+        await sync_to_async(self.assertPartialTurnSaved)()
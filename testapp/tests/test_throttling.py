@@ -0,0 +1,56 @@
+from django.contrib.auth.models import User
+from django.test import override_settings
+
+from rest_framework.exceptions import Throttled
+
+from ..models import Message
+from ..throttling import acquire_inflight_slot, release_inflight_slot, take_token, upstream_admission
+from .base import APITestCase
+
+
+@override_settings(CHAT_THROTTLE_BURST=3, CHAT_THROTTLE_RATE=0.01, CHAT_MAX_INFLIGHT=2)
+class ThrottlingTests(APITestCase):
+    def test_bucket(self):
+        for _ in range(3):
+            self.assertIsNone(take_token(self.user))
+        wait = take_token(self.user)
+        self.assertAlmostEqual(wait, 100, delta=1)
+
+        # Other users have their own bucket
+        self.assertIsNone(take_token(User.objects.create_user('bob')))
+
+    def test_batch_costs_at_most_a_full_bucket(self):
+        self.assertIsNone(take_token(self.user, count=10))
+        self.assertIsNotNone(take_token(self.user))
+
+    def test_chat_endpoint_is_throttled(self):
+        for _ in range(3):
+            take_token(self.user)
+        response = self.client.post('/api/chat/message/', {'message': "Hello"}, format='json')
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+        self.assertFalse(Message.objects.exists())
+
+    def test_inflight_slots(self):
+        first = acquire_inflight_slot()
+        second = acquire_inflight_slot()
+        with self.assertRaises(Throttled):
+            acquire_inflight_slot()
+
+        release_inflight_slot(first)
+        third = acquire_inflight_slot()
+        self.assertNotEqual(third, second)
+        release_inflight_slot(second)
+        release_inflight_slot(third)
+
+    def test_admission_claims_free_slots_only(self):
+        held = acquire_inflight_slot()
+        with upstream_admission(5) as claimed:
+            self.assertEqual(claimed, 1)
+            with self.assertRaises(Throttled):
+                acquire_inflight_slot()
+        release_inflight_slot(held)
+
+        # Released when the block ends
+        with upstream_admission(5) as claimed:
+            self.assertEqual(claimed, 2)
@@ -0,0 +1,58 @@
+from django.test import override_settings
+from django.utils import timezone
+
+from ..benchmarking import stub_upstream
+from ..clients import reset_clients
+from ..models import DailyUsage, Message
+from ..openai_stub import DEFAULT_REPLY
+from .base import APITestCase
+
+
+class UsageTests(APITestCase):
+    def chat(self):
+        return self.client.post('/api/chat/message/', {'message': "Hello"}, format='json')
+
+    def test_completion_details_are_stored_on_the_reply(self):
+        with stub_upstream(0):
+            self.chat()
+        question, reply = Message.objects.order_by('id')
+        self.assertEqual(question.model, '')
+        self.assertIsNone(question.prompt_tokens)
+        self.assertTrue(reply.model)
+        self.assertGreater(reply.prompt_tokens, 0)
+        self.assertEqual(reply.completion_tokens, len(DEFAULT_REPLY) // 4)
+        self.assertEqual(reply.finish_reason, 'stop')
+        self.assertIsNotNone(reply.latency_ms)
+
+    def test_daily_rollup(self):
+        with stub_upstream(0):
+            self.chat()
+            self.chat()
+        replies = Message.objects.filter(is_user=False)
+        usage = DailyUsage.objects.get(user=self.user, day=timezone.localdate())
+        self.assertEqual(usage.completions, 2)
+        self.assertEqual(usage.prompt_tokens, sum(m.prompt_tokens for m in replies))
+        self.assertEqual(usage.completion_tokens, sum(m.completion_tokens for m in replies))
+        self.assertEqual(usage.total_latency_ms, sum(m.latency_ms for m in replies))
+        self.assertEqual(usage.max_latency_ms, max(m.latency_ms for m in replies))
+
+    def test_record(self):
+        today = timezone.localdate()
+        DailyUsage.objects.record(self.user, today, 10, 5, 100)
+        DailyUsage.objects.record(self.user, today, None, None, 50)
+        DailyUsage.objects.record(self.user, today, 30, 20, 300, completions=3, max_latency_ms=200)
+        usage = DailyUsage.objects.get()
+        self.assertEqual(
+            (usage.completions, usage.prompt_tokens, usage.completion_tokens, usage.total_latency_ms, usage.max_latency_ms),
+            (5, 40, 25, 450, 200),
+        )
+
+    @override_settings(OPENAI_BASE_URL='http://127.0.0.1:9', OPENAI_MAX_RETRIES=0)
+    def test_failed_completions_are_not_counted(self):
+        reset_clients()
+        try:
+            self.assertIn("Sorry", self.chat().data["message"])
+        finally:
+            reset_clients()
+        self.assertFalse(DailyUsage.objects.exists())
+        self.assertEqual(Message.objects.get(is_user=False).model, '')
@@ -0,0 +1,109 @@
+import math
+import random
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+
+from rest_framework.exceptions import Throttled
+from rest_framework.throttling import BaseThrottle
+
+# Rate limiting and admission control for chat turns.
+# State lives in the 'throttle' cache alias. With the local-memory backend
+# it is per process; set CHAT_THROTTLE_CACHE=database (and run
+# `manage.py createcachetable`) to share it between worker processes.
+
+
+def _cache():
+    return caches['throttle']
+
+
+def take_token(user, count=1):
+    """
+    Take ``count`` tokens (one per chat turn) from the user's bucket.
+
+    Buckets hold up to CHAT_THROTTLE_BURST tokens and refill at
+    CHAT_THROTTLE_RATE tokens per second; a batch larger than the bucket
+    costs a full bucket. Returns None if the tokens were taken, otherwise
+    the number of seconds until they are available. Concurrent
+    requests of the same user can race on the read-modify-write, so the
+    limit is approximate, which is fine for a throttle.
+    """
+    rate = settings.CHAT_THROTTLE_RATE
+    burst = settings.CHAT_THROTTLE_BURST
+    key = f'chat-bucket:{user.pk}'
+    now = time.time()
+
+    tokens, updated = _cache().get(key, (burst, now))
+    count = min(count, burst)
+    tokens = min(burst, tokens + (now - updated) * rate)
+    if tokens < count:
+        return (count - tokens) / rate
+
+    # Keep the bucket until it would be full again anyway
+    _cache().set(key, (tokens - count, now), timeout=math.ceil(burst / rate))
+    return None
+
+
+class ChatRateThrottle(BaseThrottle):
+    """Per-user token bucket for the chat endpoints"""
+
+    def allow_request(self, request, view):
+        if not request.user or not request.user.is_authenticated:
+            return True
+        self._wait = take_token(request.user)
+        return self._wait is None
+
+    def wait(self):
+        return self._wait
+
+
+def acquire_inflight_slot():
+    """
+    Claim one of CHAT_MAX_INFLIGHT slots for an upstream call and return its
+    key, or raise Throttled (429 with Retry-After) if they are all taken.
+
+    Each slot is a cache key claimed with an atomic add(). Slots expire after
+    CHAT_INFLIGHT_SLOT_TTL seconds, so a worker that dies while holding one
+    does not leak it.
+    """
+    cache = _cache()
+    slots = settings.CHAT_MAX_INFLIGHT
+    offset = random.randrange(slots)  # Spread claims over the slots
+
+    for i in range(slots):
+        key = f'chat-inflight:{(offset + i) % slots}'
+        if cache.add(key, 1, timeout=settings.CHAT_INFLIGHT_SLOT_TTL):
+            return key
+
+    raise Throttled(
+        wait=settings.CHAT_INFLIGHT_RETRY_AFTER,
+        detail="Too many chat requests in progress. Please try again shortly."
+    )
+
+
+def release_inflight_slot(key):
+    _cache().delete(key)
+
+
+@contextmanager
+def upstream_admission(count=1):
+    """
+    Hold in-flight slots for the duration of the block.
+
+    At least one slot is claimed (or Throttled raised) and up to ``count``
+    if they are free; the block gets the number claimed, which is how many
+    upstream calls it may run at once.
+    """
+    keys = [acquire_inflight_slot()]
+    try:
+        while len(keys) < count:
+            try:
+                keys.append(acquire_inflight_slot())
+            except Throttled:
+                break
+        yield len(keys)
+    finally:
+        for key in keys:
+            release_inflight_slot(key)
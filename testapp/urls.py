@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import views, async_views
 
 urlpatterns = [
     path('', views.home_view, name = 'home'),
@@ -7,6 +7,7 @@ urlpatterns = [
     path('login/', views.login_view, name = 'login'),
     path('logout/', views.logout_view, name = 'logout'),
     path('chat/', views.chat_view, name='chat'),
+    path('api/metrics/', views.metrics_view, name='metrics'),
 
     # API endpoints
     path('api/register/', views.RegisterAPI.as_view(), name='api_register'),
@@ -16,7 +17,20 @@ urlpatterns = [
 
         # Chatbot API endpoints
     path('api/chat/message/', views.chat_message, name='chat_message'),
+    path('api/chat/batch/', views.chat_batch, name='chat_batch'),
+    path('api/chat/message/stream/', async_views.chat_message_stream, name='chat_message_stream'),
+    path('api/chat/jobs/<int:job_id>/', views.get_chat_job, name='get_chat_job'),
     path('api/chat/conversations/', views.get_conversations, name='get_conversations'),
     path('api/chat/conversations/<int:conversation_id>/', views.get_conversation, name='get_conversation_detail'),
     path('api/chat/conversations/new/', views.create_conversation, name='create_conversation'),
+    path('api/chat/search/', views.search_messages, name='search_messages'),
+    path('api/chat/export/', views.export_conversations, name='export_conversations'),
+
+    # Async (ASGI) versions of the chatbot API endpoints
+    path('api/async/chat/message/', async_views.chat_message, name='async_chat_message'),
+    path('api/async/chat/conversations/', async_views.get_conversations, name='async_get_conversations'),
+    path('api/async/chat/conversations/<int:conversation_id>/', async_views.get_conversation, name='async_get_conversation_detail'),
+    path('api/async/chat/conversations/new/', async_views.create_conversation, name='async_create_conversation'),
+    path('api/async/register/', async_views.register, name='async_api_register'),
+    path('api/async/login/', async_views.login, name='async_api_login'),
 ]
\ No newline at end of file
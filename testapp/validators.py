@@ -0,0 +1,77 @@
+import gzip
+import string
+from functools import cache
+from pathlib import Path
+
+import django.contrib.auth
+from django.core.exceptions import ValidationError
+
+# The list CommonPasswordValidator uses
+DEFAULT_PASSWORD_LIST_PATH = Path(django.contrib.auth.__file__).resolve().parent / 'common-passwords.txt.gz'
+
+SPECIAL_CHARACTERS = '!@#$%^&*(),.?":{}|<>'
+
+# Required character classes. A password is scanned once, into the set of
+# its characters, which is then checked against each class; that is several
+# times faster than a regex search per class or one alternation regex.
+_CHARACTER_CLASSES = [
+    (frozenset(string.ascii_uppercase),
+     "Password must contain at least one uppercase letter.", 'password_no_upper'),
+    (frozenset(string.digits),
+     "Password must contain at least one number.", 'password_no_digit'),
+    (frozenset(SPECIAL_CHARACTERS),
+     "Password must contain at least one special character.", 'password_no_special'),
+]
+
+
+@cache
+def common_passwords(path=DEFAULT_PASSWORD_LIST_PATH):
+    """The common-password list, lowercased, loaded once per process"""
+    path = Path(path)
+    opener = gzip.open if path.suffix == '.gz' else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        return frozenset(line.strip().lower() for line in f if line.strip())
+
+
+class PasswordPolicyValidator:
+    """
+    The password policy of the site, as one Django password validator.
+
+    Replaces MinimumLengthValidator, CommonPasswordValidator,
+    NumericPasswordValidator and the serializers' own checks for upper-case
+    letters, digits and special characters. Every violated rule is reported,
+    not just the first one.
+    """
+
+    def __init__(self, min_length=8, password_list_path=DEFAULT_PASSWORD_LIST_PATH):
+        self.min_length = min_length
+        self.common_passwords = common_passwords(password_list_path)
+
+    def validate(self, password, user=None):
+        errors = []
+        if len(password) < self.min_length:
+            errors.append(ValidationError(
+                "Password must be at least %(min_length)d characters long.",
+                code='password_too_short',
+                params={'min_length': self.min_length},
+            ))
+
+        characters = set(password)
+        for character_class, message, code in _CHARACTER_CLASSES:
+            if character_class.isdisjoint(characters):
+                errors.append(ValidationError(message, code=code))
+
+        if password.isdigit():
+            errors.append(ValidationError("This password is entirely numeric.", code='password_entirely_numeric'))
+        if password.lower().strip() in self.common_passwords:
+            errors.append(ValidationError("This password is too common.", code='password_too_common'))
+
+        if errors:
+            raise ValidationError(errors)
+
+    def get_help_text(self):
+        return (
+            f"Your password must contain at least {self.min_length} characters, including an "
+            f"uppercase letter, a number and one of {SPECIAL_CHARACTERS}, and can't be a "
+            "commonly used password."
+        )
@@ -1,8 +1,14 @@
 from django.shortcuts import render, redirect
+from django.urls import reverse
 from django.contrib.auth.models import User
 from django.contrib.auth import authenticate, login, logout
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.http import require_GET
 
 
 from rest_framework import status
@@ -10,11 +16,19 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.authtoken.models import Token  
 from rest_framework.permissions import IsAuthenticated
-from rest_framework.decorators import api_view, permission_classes  
+from rest_framework.decorators import api_view, permission_classes, throttle_classes
+from rest_framework.exceptions import Throttled
 
+from . import archive, conditional, export, jobs, metrics, search
+from .clients import serving_asgi
 from .services import ChatbotService
-from .serializers import ChatMessageSerializer, ConversationSerializer
-from .models import Conversation
+from .throttling import ChatRateThrottle, take_token, upstream_admission
+from .serializers import ChatBatchSerializer, ChatJobSerializer, ChatMessageSerializer, ConversationSerializer, ConversationSummarySerializer, MessageSerializer, SearchResultSerializer
+from .models import ChatJob, Conversation
+from .pagination import (
+    decode_cursor, get_page_size, keyset_paginate, message_page, message_page_in_memory, message_result,
+    parse_message_cursors
+)
 
 from .serializers import UserSerializer, RegisterSerializer, LoginSerializer, ProfileUpdateSerializer
 
@@ -94,6 +108,23 @@ def chat_view(request):
     return render(request, "testapp/chat.html")
 
 
+def can_read_metrics(request):
+    """Staff, a scraper with METRICS_TOKEN, or a METRICS_ALLOWED_IPS address"""
+    if request.user.is_staff:
+        return True
+    scheme, _, token = request.META.get('HTTP_AUTHORIZATION', '').partition(' ')
+    if settings.METRICS_TOKEN and scheme.lower() == 'bearer':
+        return constant_time_compare(token, settings.METRICS_TOKEN)
+    return request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS
+
+@require_GET
+def metrics_view(request):
+    """Request metrics in the Prometheus text format, for scrapers and staff"""
+    if not can_read_metrics(request):
+        return HttpResponseForbidden()
+    return HttpResponse(metrics.render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 # API Views
 
 class RegisterAPI(APIView):
@@ -122,7 +153,7 @@ class RegisterAPI(APIView):
         serializer = RegisterSerializer(data=request.data)
         if serializer.is_valid():
             user = serializer.save()
-            token, created = Token.objects.get_or_create(user=user)
+            token = Token.objects.create(user=user)  # The user is new
             return Response({
                 'user': UserSerializer(user).data,
                 'token': token.key
@@ -231,64 +262,341 @@ class ProfileUpdateAPI(APIView):
                 }
             )
         ),
+        202: ChatJobSerializer,
         400: "Bad Request",
-        401: "Unauthorized"
+        401: "Unauthorized",
+        429: "Too Many Requests"
     },
-    operation_description="Send a message to the chatbot and get a response"
+    operation_description="Send a message to the chatbot and get a response. "
+                          "With async=true the completion is queued and a job is returned "
+                          "immediately; poll its Location for the response.",
+    manual_parameters=[
+        openapi.Parameter('async', openapi.IN_QUERY, type=openapi.TYPE_BOOLEAN,
+                          description="Queue the completion instead of waiting for it"),
+    ]
 )
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@throttle_classes([ChatRateThrottle])
 def chat_message(request):
     """Send a message to the chatbot and get a response"""
     serializer = ChatMessageSerializer(data=request.data)
     
     if serializer.is_valid():
+        if request.query_params.get('async') in ('1', 'true'):
+            job = jobs.enqueue(
+                user=request.user,
+                message_text=serializer.validated_data['message'],
+                conversation_id=serializer.validated_data.get('conversation_id')
+            )
+            return Response(
+                ChatJobSerializer(job).data,
+                status=status.HTTP_202_ACCEPTED,
+                headers={'Location': reverse('get_chat_job', args=[job.id])}
+            )
+
         chatbot = ChatbotService()
-        response = chatbot.get_chat_response(
-            user=request.user,
-            message_text=serializer.validated_data['message'],
-            conversation_id=serializer.validated_data.get('conversation_id')
-        )
+        with upstream_admission():
+            response = chatbot.get_chat_response(
+                user=request.user,
+                message_text=serializer.validated_data['message'],
+                conversation_id=serializer.validated_data.get('conversation_id')
+            )
         return Response(response)
     
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+@swagger_auto_schema(
+    method='post',
+    request_body=ChatBatchSerializer,
+    responses={
+        200: openapi.Response(
+            description="One result per message, in order: the chat response, or the item's errors",
+            schema=openapi.Schema(
+                type=openapi.TYPE_OBJECT,
+                properties={
+                    'results': openapi.Schema(
+                        type=openapi.TYPE_ARRAY,
+                        items=openapi.Schema(
+                            type=openapi.TYPE_OBJECT,
+                            properties={
+                                'conversation_id': openapi.Schema(type=openapi.TYPE_INTEGER),
+                                'message': openapi.Schema(type=openapi.TYPE_STRING),
+                                'errors': openapi.Schema(type=openapi.TYPE_OBJECT),
+                            }
+                        )
+                    ),
+                }
+            )
+        ),
+        400: "Bad Request",
+        401: "Unauthorized",
+        429: "Too Many Requests"
+    },
+    operation_description="Send several messages to the chatbot in one request. "
+                          "The completions run concurrently and each message counts "
+                          "against the chat rate limit."
+)
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def chat_batch(request):
+    """Send several messages to the chatbot and get all the responses"""
+    serializer = ChatBatchSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    results = []
+    items = []
+    for data in serializer.validated_data['messages']:
+        item = ChatMessageSerializer(data=data)
+        if item.is_valid():
+            items.append(item.validated_data)
+            results.append(None)
+        else:
+            results.append({"errors": item.errors})
+
+    if items:
+        wait = take_token(request.user, len(items))
+        if wait is not None:
+            raise Throttled(wait=wait)
+
+        chatbot = ChatbotService()
+        with upstream_admission(min(len(items), settings.CHATBOT_BATCH_CONCURRENCY)) as slots:
+            responses = iter(chatbot.get_chat_responses(request.user, items, concurrency=slots))
+        results = [result or next(responses) for result in results]
+
+    return Response({"results": results})
+
+@swagger_auto_schema(
+    method='get',
+    responses={
+        200: ChatJobSerializer,
+        401: "Unauthorized",
+        404: "Not Found"
+    },
+    operation_description="Get the status and, once done, the response of a queued chat message"
+)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_chat_job(request, job_id):
+    """Get the status and result of a queued chat message"""
+    try:
+        job = ChatJob.objects.get(id=job_id, user=request.user)
+    except ChatJob.DoesNotExist:
+        return Response({"error": "Job not found"}, status=status.HTTP_404_NOT_FOUND)
+
+    return Response(ChatJobSerializer(job).data)
+
 @swagger_auto_schema(
     method='get',
     responses={
         200: ConversationSerializer(many=True),
+        304: "Not Modified",
         401: "Unauthorized"
     },
-    operation_description="Get all conversations for the current user"
+    operation_description="Get all conversations for the current user, most recently active first. "
+                          "Pass summary=true for a paginated list of conversation summaries. "
+                          "Supports conditional requests with If-None-Match or If-Modified-Since.",
+    manual_parameters=[
+        openapi.Parameter('summary', openapi.IN_QUERY, type=openapi.TYPE_BOOLEAN,
+                          description="Return id, created_at, last_message_at, message count and last-message preview only"),
+        openapi.Parameter('cursor', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                          description="next_cursor from the previous summary page"),
+        openapi.Parameter('limit', openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+                          description="Summary page size"),
+    ]
 )
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_conversations(request):
     """Get all conversations for the current user"""
-    conversations = Conversation.objects.filter(user=request.user).order_by('-created_at')
-    serializer = ConversationSerializer(conversations, many=True)
-    return Response(serializer.data)
+    # Most recently active first
+    conversations = Conversation.objects.filter(user=request.user).order_by('-last_message_at', '-id')
+    version = conditional.list_version(conversations)
+    unchanged = conditional.not_modified(request, version)
+    if unchanged:
+        return unchanged
+
+    if request.query_params.get('summary') in ('1', 'true'):
+        response = _conversation_summaries(request, conversations)
+    else:
+        conversations = conversations.select_related('archive').prefetch_related('messages')
+        serializer = ConversationSerializer(conversations, many=True)
+        response = Response(serializer.data)
+
+    if response.status_code == status.HTTP_200_OK:
+        conditional.add_validators(response, version)
+    return response
+
+def _conversation_summaries(request, conversations):
+    """One page of conversation summaries, from the denormalized Conversation fields alone"""
+    cursor = request.query_params.get('cursor')
+    position = decode_cursor(cursor) if cursor else None
+    if cursor and position is None:
+        return Response({"error": "Invalid cursor"}, status=status.HTTP_400_BAD_REQUEST)
+
+    page, next_cursor = keyset_paginate(
+        conversations.with_summary(), 'last_message_at', position, get_page_size(request.query_params)
+    )
+    serializer = ConversationSummarySerializer(page, many=True)
+    return Response({"results": serializer.data, "next_cursor": next_cursor})
 
 @swagger_auto_schema(
     method='get',
     responses={
         200: ConversationSerializer,
+        304: "Not Modified",
+        400: "Bad Request",
         401: "Unauthorized",
         404: "Not Found"
     },
-    operation_description="Get a specific conversation by ID"
+    operation_description="Get a specific conversation by ID. Pass limit, before or after "
+                          "to get one page of its messages instead of the whole history. "
+                          "Supports conditional requests with If-None-Match or If-Modified-Since.",
+    manual_parameters=[
+        openapi.Parameter('limit', openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+                          description="Number of messages per page"),
+        openapi.Parameter('before', openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+                          description="Only return messages older than this message id"),
+        openapi.Parameter('after', openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+                          description="Only return messages newer than this message id"),
+    ]
 )
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_conversation(request, conversation_id):
     """Get a specific conversation by ID"""
     try:
-        conversation = Conversation.objects.get(id=conversation_id, user=request.user)
+        conversation = (
+            Conversation.objects.select_related('archive')
+            .defer('archive__data')  # Not needed for a 304
+            .get(id=conversation_id, user=request.user)
+        )
     except Conversation.DoesNotExist:
         return Response({"error": "Conversation not found"}, status=status.HTTP_404_NOT_FOUND)
-    
-    serializer = ConversationSerializer(conversation)
-    return Response(serializer.data)
+
+    version = conditional.conversation_version(conversation)
+    unchanged = conditional.not_modified(request, version)
+    if unchanged:
+        return unchanged
+
+    if any(param in request.query_params for param in ('limit', 'before', 'after')):
+        response = _message_page(request, conversation)
+    else:
+        serializer = ConversationSerializer(conversation)
+        response = Response(serializer.data)
+
+    if response.status_code == status.HTTP_200_OK:
+        conditional.add_validators(response, version)
+    return response
+
+def _message_page(request, conversation):
+    """One page of a conversation's messages, oldest first"""
+    try:
+        before, after = parse_message_cursors(request.query_params)
+    except ValueError:
+        return Response({"error": "before and after must be message ids"}, status=status.HTTP_400_BAD_REQUEST)
+
+    page_size = get_page_size(request.query_params, default=50)
+    archived = archive.archived_messages(conversation)
+    if archived is not None:
+        rows, newest_first = message_page_in_memory(archived, before, after, page_size)
+    else:
+        messages, newest_first = message_page(conversation.messages.all(), before, after, page_size)
+        rows = list(messages)
+    page, has_more = message_result(rows, page_size, newest_first)
+
+    return Response({
+        "id": conversation.id,
+        "created_at": conversation.created_at,
+        "messages": MessageSerializer(page, many=True).data,
+        "has_more": has_more,
+    })
+
+@swagger_auto_schema(
+    method='get',
+    responses={
+        200: SearchResultSerializer(many=True),
+        400: "Bad Request",
+        401: "Unauthorized"
+    },
+    operation_description="Search the current user's messages. Results are ranked best match "
+                          "first; every word must match, the last one as a prefix.",
+    manual_parameters=[
+        openapi.Parameter('q', openapi.IN_QUERY, type=openapi.TYPE_STRING, required=True,
+                          description="Words to search for"),
+        openapi.Parameter('limit', openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+                          description="Results per page"),
+        openapi.Parameter('offset', openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+                          description="next_offset from the previous page"),
+    ]
+)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def search_messages(request):
+    """Full-text search of the current user's messages"""
+    query = request.query_params.get('q', '').strip()
+    if not query:
+        return Response({"error": "q is required"}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        offset = max(0, int(request.query_params.get('offset', 0)))
+    except ValueError:
+        return Response({"error": "offset must be a number"}, status=status.HTTP_400_BAD_REQUEST)
+
+    page_size = get_page_size(request.query_params, default=20)
+    results, has_more = search.search_messages(request.user, query, page_size, offset)
+
+    return Response({
+        "results": SearchResultSerializer(results, many=True).data,
+        "next_offset": offset + page_size if has_more else None,
+    })
+
+def accepts_gzip(request):
+    """
+    Whether the request's Accept-Encoding allows gzip: listed (or covered by
+    "*") with a q-value above 0, so "gzip;q=0" refuses it
+    """
+    qvalues = {}
+    for item in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        coding, *params = item.split(';')
+        qvalue = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    qvalue = float(value)
+                except ValueError:
+                    qvalue = 0.0
+        qvalues[coding.strip().lower()] = qvalue
+    for coding in ('gzip', 'x-gzip', '*'):
+        if coding in qvalues:
+            return qvalues[coding] > 0
+    return False
+
+@swagger_auto_schema(
+    method='get',
+    responses={
+        200: "NDJSON: a conversation record followed by its message records, per conversation",
+        401: "Unauthorized"
+    },
+    operation_description="Export all of the current user's conversations as newline-delimited JSON. "
+                          "The response is streamed, gzip-compressed if the client accepts it."
+)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def export_conversations(request):
+    """Stream an NDJSON export of the current user's conversations"""
+    conversations = Conversation.objects.filter(user=request.user)
+    compress = accepts_gzip(request)
+    chunks = export.export_ndjson_gzip(conversations) if compress else export.export_ndjson(conversations)
+    if serving_asgi():
+        chunks = export.aiterate(chunks)
+    response = StreamingHttpResponse(chunks, content_type='application/x-ndjson')
+    if compress:
+        response['Content-Encoding'] = 'gzip'
+    patch_vary_headers(response, ['Accept-Encoding'])
+    response['Content-Disposition'] = 'attachment; filename="conversations.ndjson"'
+    return response
 
 @swagger_auto_schema(
     method='post',